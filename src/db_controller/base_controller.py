@@ -3,6 +3,7 @@ import os
 import re
 import datetime
 import time
+import json
 
 class BaseDBController(ABC):
     """ Base template to be extended to support various dbms (e.g., postgresql, mysql) """
@@ -32,6 +33,13 @@ class BaseDBController(ABC):
         
         return cls(db, db_user, password, restart_cmd, recover_script, port)
     
+    def connection_params(self):
+        """ Constructor arguments to open an equivalent controller in another process """
+        return {
+            "db": self.db, "user": self.user, "password": self.password,
+            "restart_cmd": self.restart_cmd, "recover_script": self.recover_script, "port": self.port
+        }
+
     def is_numerical(self, value):
         """ Returns true iff value is number, optionally followed by unit. """
         param_reg = r'[a-z_]+_[a-z]+'
@@ -72,6 +80,56 @@ class BaseDBController(ABC):
                 print(f'Exception while trying to recover dbms: {e}')
                 return False
     
+    def explain_many(self, queries):
+        """
+        Return the parsed EXPLAIN (FORMAT JSON) plan of every query, in order, with None for queries
+        that fail. This default issues one round trip per query; subclasses batch them.
+        """
+        plans = []
+        for query in queries:
+            result = self.execute_sql(f"EXPLAIN (FORMAT JSON) {query}")
+            plans.append(self.parse_json_plan(result["result"][0][0]) if result["error"] is None and result["result"] else None)
+        return plans
+
+    def prepare_statement(self, name, sql):
+        """
+        Register a parameterized statement ($1..$n) under name so that probes can be issued as
+        EXECUTE name(...). Returns False when the dbms controller does not support it.
+        """
+        return False
+
+    def ensure_pool_size(self, size):
+        """
+        Make sure `size` threads can run queries at the same time, each on its own connection.
+        Returns False when the dbms controller only has one shared connection.
+        """
+        return False
+
+    def get_statistics_version(self):
+        """
+        Fingerprint of everything the optimizer's estimates depend on (table statistics, cost settings),
+        used to invalidate cached estimates. None if the dbms controller cannot tell.
+        """
+        return None
+
+    def get_column_statistics(self):
+        """
+        Per-column planner statistics (null fraction, distinct count, most common values and
+        their frequencies, histogram bounds) for local selectivity estimates. None if the dbms controller cannot tell.
+        """
+        return None
+
+    @staticmethod
+    def parse_json_plan(plan_json):
+        """ Unwrap the single-element list returned by EXPLAIN (FORMAT JSON) """
+        if plan_json is None:
+            return None
+        if isinstance(plan_json, str):
+            plan_json = json.loads(plan_json)
+        if isinstance(plan_json, list) and len(plan_json) > 0:
+            return plan_json[0]
+        return plan_json
+
     # move it in the future
     def create_template(self, test):
         self._copy_db(source_db="benchbase", target_db=f"{test}_template")
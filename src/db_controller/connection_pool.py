@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+
+class PostgreSQLConnectionPool:
+    """ Fixed-size pool of psycopg2 connections, checked out by one thread at a time """
+    def __init__(self, size, database, user, password, host, port):
+        if size < 1:
+            raise ValueError(f"Invalid pool size '{size}'. Must be at least 1.")
+        self.size = size
+        self.connect_kwargs = {
+            "database": database, "user": user,
+            "password": password, "host": host, "port": port
+        }
+        # idle connections (used LIFO) and the number of open slots, both guarded by _available,
+        # which is notified whenever a connection is returned or a slot is freed
+        self._idle = []
+        self._available = threading.Condition()
+        self._num_connections = 0
+        self._closed = False
+
+    def _new_connection(self):
+        connection = psycopg2.connect(**self.connect_kwargs)
+        connection.autocommit = True
+        return connection
+
+    @staticmethod
+    def is_healthy(connection):
+        """ Cheap liveness check that does not need a round trip to the server """
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        return status != psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+
+    def checkout(self, timeout=None):
+        """
+        Return an idle connection, opening a new one while the pool is below its size.
+        Blocks (up to timeout seconds, then raises queue.Empty) when all connections are in use,
+        until one is checked in or discarded.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._num_connections < self.size:
+                    self._num_connections += 1
+                    connection = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._available.wait(remaining)
+
+        if connection is not None and not self.is_healthy(connection):
+            # reconnect the broken slot instead of handing out a dead connection
+            self._close_quietly(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = self._new_connection()
+            except Exception:
+                self._release_slots(1)
+                raise
+        return connection
+
+    def _release_slots(self, count):
+        """ Forget closed connections and wake the threads waiting for a slot """
+        with self._available:
+            self._num_connections -= count
+            self._available.notify_all()
+
+    def checkin(self, connection, discard=False):
+        """ Return a connection to the pool, closing it if it is broken or discarded """
+        if discard or self._closed or not self.is_healthy(connection):
+            self._close_quietly(connection)
+            self._release_slots(1)
+            return
+
+        if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                self._close_quietly(connection)
+                self._release_slots(1)
+                return
+        with self._available:
+            self._idle.append(connection)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """ Check out a connection for the duration of a with-block """
+        connection = self.checkout()
+        try:
+            yield connection
+        finally:
+            # checkin drops the connection if the server closed it during the block
+            self.checkin(connection)
+
+    def close_all(self):
+        """ Close every idle connection; connections still checked out are closed on checkin """
+        with self._available:
+            self._closed = True
+            self._available.notify_all()
+        self.discard_idle()
+
+    def discard_idle(self):
+        """ Drop all idle connections, e.g. after the server restarted and they are all stale """
+        with self._available:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close_quietly(connection)
+        if idle:
+            self._release_slots(len(idle))
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
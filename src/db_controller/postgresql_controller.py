@@ -1,14 +1,108 @@
 from db_controller.base_controller import BaseDBController
+from db_controller.connection_pool import PostgreSQLConnectionPool
 import psycopg2
+import psycopg2.errors
 import time, os
+import weakref
+import threading
 import json, decimal, datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 class PostgreSQLController(BaseDBController):
     """ Instantiate DBMSTemplate to support PostgreSQL DBMS """
-    def __init__(self, db, user, password, restart_cmd, recover_script, port):
+    # session-local helper used by explain_many to EXPLAIN a whole batch of queries in one round trip
+    EXPLAIN_FUNCTION_SQL = """
+        CREATE OR REPLACE FUNCTION pg_temp.sqlbarber_explain(query text) RETURNS json AS $$
+        DECLARE
+            plan json;
+        BEGIN
+            EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+            RETURN plan;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+    """
+    EXPLAIN_BATCH_SQL = """
+        SELECT pg_temp.sqlbarber_explain(batch.query)
+        FROM unnest(%s::text[]) WITH ORDINALITY AS batch(query, position)
+        ORDER BY batch.position;
+    """
+
+    # fingerprint of table sizes, ANALYZE runs and planner settings, see get_statistics_version
+    STATISTICS_VERSION_SQL = """
+        SELECT md5(string_agg(entry, ',' ORDER BY entry)) FROM (
+            SELECT format('%s.%s:%s:%s:%s:%s', n.nspname, c.relname, c.reltuples, c.relpages,
+                          pg_relation_size(c.oid), greatest(s.last_analyze, s.last_autoanalyze)) AS entry
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+            WHERE c.relkind IN ('r', 'm', 'p')
+              AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+              AND n.nspname NOT LIKE 'pg_toast%'
+              AND n.nspname NOT LIKE 'pg_temp%'
+            UNION ALL
+            SELECT format('%s=%s', name, setting) FROM pg_settings
+            WHERE name LIKE '%cost%' OR name LIKE 'enable_%'
+               OR name IN ('default_statistics_target', 'effective_cache_size', 'work_mem', 'server_version_num')
+            UNION ALL
+            SELECT current_database()
+        ) AS statistics;
+    """
+
+    # planner statistics of every public column, see get_column_statistics
+    COLUMN_STATISTICS_SQL = """
+        SELECT s.tablename, s.attname, s.null_frac, s.n_distinct,
+               s.most_common_vals::text::text[], s.most_common_freqs, s.histogram_bounds::text::text[], c.reltuples
+        FROM pg_stats s
+        JOIN pg_namespace n ON n.nspname = s.schemaname
+        JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+        WHERE s.schemaname = 'public';
+    """
+
+    # per-table change signature: cumulative row changes, changes since ANALYZE, relation size and column list
+    TABLE_SIGNATURES_SQL = """
+        SELECT c.relname,
+               format('%s:%s:%s:%s:%s:%s', s.n_tup_ins, s.n_tup_upd, s.n_tup_del, s.n_mod_since_analyze,
+                      pg_relation_size(c.oid),
+                      (SELECT md5(string_agg(a.attname || ' ' || format_type(a.atttypid, a.atttypmod), ',' ORDER BY a.attnum))
+                       FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped))
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'm', 'p', 'v', 'f');
+    """
+
+    def __init__(self, db, user, password, restart_cmd, recover_script, port, pool_size=0):
+        """
+            Args:
+                pool_size: number of pooled connections used by execute_sql; 0 shares the single self.connection
+        """
+        self.pool_size = pool_size
+        self.pool = None
+        self.current_db = db
+        # name -> parameterized SQL, prepared lazily on every connection that runs a probe
+        self.prepared_statements = {}
+        self._prepared_on = weakref.WeakKeyDictionary()
+        self._prepare_lock = threading.Lock()
         super().__init__(db, user, password, restart_cmd, recover_script, port)
         self.name = "postgres"
+
+    @classmethod
+    def from_file(cls, config):
+        db_config = config['DATABASE']
+        return cls(
+            db_config['db'], db_config['user'], db_config['password'],
+            db_config['restart_cmd'], db_config['recover_script'], db_config['port'],
+            pool_size=db_config.getint('pool_size', fallback=0)
+        )
     
+    def connection_params(self):
+        """ Same as the base class, but for the database currently connected to (see _connect(db)) """
+        params = super().connection_params()
+        params["db"] = self.current_db
+        return params
+
     def _connect(self, db=None):
         """ Establish connection to database, return success flag """
         self.failed_times = 0
@@ -22,6 +116,8 @@ class PostgreSQLController(BaseDBController):
                     password = self.password, host = "localhost", port=self.port
                 )
                 print(f"Success to connect to {db} with user {self.user}")
+                self.current_db = db
+                self._reset_pool()
                 return True
             except Exception as e:
                 self.failed_times += 1
@@ -34,12 +130,39 @@ class PostgreSQLController(BaseDBController):
             
     def _disconnect(self):
         """ Disconnect from database. """
+        if self.pool is not None:
+            self.pool.close_all()
+            self.pool = None
         if self.connection:
             print('Disconnecting ...')
             self.connection.close()
             print('Disconnecting done ...')
             self.connection = None
 
+    def _reset_pool(self):
+        """ (Re)build the connection pool for the currently connected database """
+        if self.pool is not None:
+            self.pool.close_all()
+            self.pool = None
+        if self.pool_size and self.pool_size > 0:
+            self.pool = PostgreSQLConnectionPool(
+                self.pool_size, database=self.current_db, user=self.user,
+                password=self.password, host="localhost", port=self.port
+            )
+
+    def ensure_pool_size(self, size):
+        """
+        Grow the connection pool to at least `size` connections, so that `size` threads running
+        execute_sql or explain_many never share (and serialize on) a connection. Returns True.
+        """
+        if self.pool_size >= size:
+            return True
+        print(f"Growing the connection pool from {self.pool_size} to {size} connections for {size} concurrent workers")
+        self.pool_size = size
+        if self.connection is not None:
+            self._reset_pool()
+        return True
+
     def _copy_db(self, target_db, source_db):
         # for tpcc, recover the data for the target db(benchbase)
         self.update_dbms(f'drop database if exists {target_db}')
@@ -96,6 +219,9 @@ class PostgreSQLController(BaseDBController):
         
     def execute_sql(self, sql):
         """ Execute SQL on dbms and return the execution result or an error message """
+        if self.pool is not None:
+            return self._execute_sql_pooled(sql)
+
         if self.connection is None:
             if not self._connect():
                 print("Failed to reconnect to the database.")
@@ -122,18 +248,178 @@ class PostgreSQLController(BaseDBController):
             # Return the error message
             return {"result": None, "error": str(e)}
 
-    def get_column_info(self, folder_path):
+    def _execute_sql_pooled(self, sql, retries=1):
+        """ Execute SQL on a connection checked out from the pool, reconnecting once if it was dropped """
+        for attempt in range(retries + 1):
+            try:
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor()
+                    try:
+                        cursor.execute(sql)
+                        try:
+                            result = cursor.fetchall()
+                        except psycopg2.ProgrammingError:
+                            result = None
+                    finally:
+                        cursor.close()
+                return {"result": result, "error": None}
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # a lost connection carries no SQLSTATE; the pool drops it and the retry opens a fresh one
+                if attempt == retries or getattr(e, "pgcode", None) is not None:
+                    return {"result": None, "error": str(e)}
+                # the other idle connections most likely died with this one (e.g. dbms restart)
+                self.pool.discard_idle()
+            except psycopg2.Error as e:
+                return {"result": None, "error": str(e)}
+
+    def explain_many(self, queries, batch_size=64):
+        """
+        Return the parsed EXPLAIN (FORMAT JSON) plan of every query, in order, with None for queries
+        that fail. Each chunk of batch_size queries costs a single round trip to the server.
+        """
+        plans = []
+        for start in range(0, len(queries), batch_size):
+            chunk = list(queries[start:start + batch_size])
+            try:
+                if self.pool is not None:
+                    with self.pool.connection() as connection:
+                        chunk_plans = self._explain_batch(connection, chunk)
+                else:
+                    if self.connection is None and not self._connect():
+                        raise psycopg2.OperationalError("Failed to reconnect to the database")
+                    chunk_plans = self._explain_batch(self.connection, chunk)
+            except psycopg2.Error as e:
+                print(f"Error during batched EXPLAIN: {e}")
+                chunk_plans = [None] * len(chunk)
+            plans.extend(chunk_plans)
+        return plans
+
+    def _explain_batch(self, connection, queries):
+        """ EXPLAIN all queries over one connection, creating the session-local helper on first use """
+        connection.autocommit = True
+        cursor = connection.cursor()
+        try:
+            self._ensure_prepared(connection, cursor)
+            try:
+                cursor.execute(self.EXPLAIN_BATCH_SQL, (queries,))
+            except (psycopg2.errors.UndefinedFunction, psycopg2.errors.InvalidSchemaName):
+                cursor.execute(self.EXPLAIN_FUNCTION_SQL)
+                cursor.execute(self.EXPLAIN_BATCH_SQL, (queries,))
+            return [self.parse_json_plan(row[0]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def get_statistics_version(self):
+        """ md5 over table statistics and planner settings; changes after ANALYZE, data growth or a config change """
+        result = self.execute_sql(self.STATISTICS_VERSION_SQL)
+        if result["error"] is not None or not result["result"]:
+            print(f"Failed to read the statistics version: {result['error']}")
+            return None
+        return result["result"][0][0]
+
+    def get_column_statistics(self):
+        """
+        The planner statistics (pg_stats) of every public column:
+        {table: {"reltuples": float, "columns": {column: {"null_frac", "n_distinct", "most_common_vals",
+        "most_common_freqs", "histogram_bounds"}}}}, with values as text. None on error.
+        """
+        result = self.execute_sql(self.COLUMN_STATISTICS_SQL)
+        if result["error"] is not None or result["result"] is None:
+            print(f"Failed to read column statistics: {result['error']}")
+            return None
+
+        column_statistics = {}
+        for table_name, column_name, null_frac, n_distinct, mcv, mcv_freqs, histogram_bounds, reltuples in result["result"]:
+            table_statistics = column_statistics.setdefault(table_name, {"reltuples": float(reltuples), "columns": {}})
+            table_statistics["columns"][column_name] = {
+                "null_frac": float(null_frac or 0.0),
+                "n_distinct": float(n_distinct or 0.0),
+                "most_common_vals": mcv or [],
+                "most_common_freqs": [float(freq) for freq in mcv_freqs or []],
+                "histogram_bounds": histogram_bounds or [],
+            }
+        return column_statistics
+
+    def prepare_statement(self, name, sql):
+        """
+        Register a parameterized statement ($1..$n) under name and validate it by preparing it once.
+        Afterwards queries such as "EXECUTE name('v1', 'v2')" can be passed to explain_many.
+        Returns True if the statement was prepared successfully.
+        """
+        self.prepared_statements[name] = sql.strip().rstrip(';')
+        try:
+            if self.pool is not None:
+                with self.pool.connection() as connection:
+                    self._prepare_on_connection(connection)
+            else:
+                if self.connection is None and not self._connect():
+                    raise psycopg2.OperationalError("Failed to reconnect to the database")
+                self._prepare_on_connection(self.connection)
+            return True
+        except psycopg2.Error as e:
+            print(f"Failed to prepare statement {name}: {e}")
+            self.prepared_statements.pop(name, None)
+            return False
+
+    def _prepare_on_connection(self, connection):
+        connection.autocommit = True
+        cursor = connection.cursor()
+        try:
+            self._ensure_prepared(connection, cursor)
+        finally:
+            cursor.close()
+
+    def _ensure_prepared(self, connection, cursor):
+        """ Prepare the registered statements that this connection has not prepared yet (or prepared with other SQL) """
+        if not self.prepared_statements:
+            return
+        with self._prepare_lock:
+            self._ensure_prepared_locked(connection, cursor)
+
+    def _ensure_prepared_locked(self, connection, cursor):
+        prepared = self._prepared_on.get(connection)
+        if prepared is None:
+            # re-plan every EXECUTE with its bound values: a generic plan ignores the values and
+            # would report the same estimate for every predicate assignment
+            cursor.execute("SET plan_cache_mode = force_custom_plan;")
+            prepared = self._prepared_on[connection] = {}
+        for name, sql in list(self.prepared_statements.items()):
+            if prepared.get(name) == sql:
+                continue
+            if name in prepared:
+                cursor.execute(f"DEALLOCATE {name};")
+                del prepared[name]
+            cursor.execute(f"PREPARE {name} AS {sql};")
+            prepared[name] = sql
+
+    def get_column_info(self, folder_path, sampled=False, workers=4, sample_rows=100000, refresh=False, representative_values=False):
         """
         Fetch all tables and their column metadata including min, max, total distinct count,
         and store up to 500 'sampled_distinct_values' for each column by sampling the actual
         column values in the table. (No random value generation for numeric columns.)
 
-        OPTIMIZED: Uses batched queries to minimize database round-trips.
+        OPTIMIZED: Uses batched queries to minimize database round-trips, and collects the tables
+        in parallel over `workers` connections, printing progress as tables complete.
+        sampled=True avoids full-table scans on large tables: distinct counts come from pg_stats
+        (n_distinct), and min, max and distinct values are read from a TABLESAMPLE SYSTEM sample of
+        about sample_rows rows. Tables without statistics fall back to COUNT(DISTINCT) on the sample.
+        refresh=True recollects only the tables whose change signature (see TABLE_SIGNATURES_SQL) differs
+        from the one stored in column_info_state.json by the previous collection, and keeps the others.
+        representative_values=True samples the values of columns with more than 500 distinct values
+        as equi-depth quantiles plus their heavy most common values, see _representative_values.
         """
         
         os.makedirs(folder_path, exist_ok=True)
+        file_name = os.path.join(folder_path, "column_info.json")
+        state_file_name = os.path.join(folder_path, "column_info_state.json")
 
-        table_metadata = {}
+        previous_metadata, previous_signatures = {}, {}
+        if refresh:
+            previous_metadata, previous_signatures = self._load_column_info_state(file_name, state_file_name, sampled, representative_values)
+
+        # on a failure before the tables are collected, a refresh keeps the previous metadata
+        table_metadata = dict(previous_metadata)
+        signatures = {}
 
         try:
             self.connection.autocommit = True
@@ -145,112 +431,275 @@ class PostgreSQLController(BaseDBController):
                 FROM information_schema.tables
                 WHERE table_schema = 'public';
             """)
-            tables = cursor.fetchall()
-
-            for table in tables:
-                table_name = table[0]
-                table_metadata[table_name] = {}
-
-                # Step 2: Get columns for the current table
-                cursor.execute(f"""
-                    SELECT column_name, data_type
-                    FROM information_schema.columns
-                    WHERE table_name = '{table_name}'
-                    ORDER BY ordinal_position;
-                """)
-                columns = cursor.fetchall()
-
-                # Initialize metadata structure
-                for column in columns:
-                    column_name, column_type = column
-                    table_metadata[table_name][column_name] = {
-                        'type': column_type,
-                        'min_value': None,
-                        'max_value': None,
-                        'distinct_count': 0,
-                        'sampled_distinct_values': []
-                    }
-
-                # Step 3: OPTIMIZED - Batch all min/max/distinct_count into ONE query per table
-                if columns:
-                    # Build a single query that gets min, max, distinct count for all columns at once
-                    select_parts = []
-                    for column_name, _ in columns:
-                        select_parts.append(f"MIN({column_name}) AS min_{column_name}")
-                        select_parts.append(f"MAX({column_name}) AS max_{column_name}")
-                        select_parts.append(f"COUNT(DISTINCT {column_name}) AS distinct_{column_name}")
+            tables = [table[0] for table in cursor.fetchall()]
 
-                    combined_query = f"SELECT {', '.join(select_parts)} FROM {table_name};"
+            cursor.execute(self.TABLE_SIGNATURES_SQL)
+            current_signatures = dict(cursor.fetchall())
+            cursor.close()
 
-                    try:
-                        cursor.execute(combined_query)
-                        result = cursor.fetchone()
-
-                        # Parse results - every 3 values correspond to one column (min, max, distinct_count)
-                        for idx, (column_name, _) in enumerate(columns):
-                            col_info = table_metadata[table_name][column_name]
-                            col_info['min_value'] = result[idx * 3]
-                            col_info['max_value'] = result[idx * 3 + 1]
-                            col_info['distinct_count'] = result[idx * 3 + 2]
-                    except Exception as e:
-                        print(f"Error fetching batch metadata for table {table_name}: {e}")
-                        # Fallback to individual queries if batch query fails
-                        for column_name, _ in columns:
-                            try:
-                                cursor.execute(f"""
-                                    SELECT MIN({column_name}), MAX({column_name}), COUNT(DISTINCT {column_name})
-                                    FROM {table_name};
-                                """)
-                                min_value, max_value, distinct_count = cursor.fetchone()
-                                col_info = table_metadata[table_name][column_name]
-                                col_info['min_value'] = min_value
-                                col_info['max_value'] = max_value
-                                col_info['distinct_count'] = distinct_count
-                            except Exception as e2:
-                                print(f"Error fetching metadata for column {column_name}: {e2}")
-
-                # Step 4: Retrieve distinct values for each column
-                for column_name, _ in columns:
-                    try:
-                        col_info = table_metadata[table_name][column_name]
-                        distinct_count = col_info['distinct_count']
+            stale_tables = [
+                table_name for table_name in tables
+                if table_name not in previous_metadata or previous_signatures.get(table_name) != current_signatures.get(table_name)
+            ]
+            if refresh:
+                print(f"Refreshing column info of {len(stale_tables)}/{len(tables)} tables: {', '.join(stale_tables) or 'none changed'}")
 
-                        if distinct_count <= 500:
-                            # Get all distinct values
-                            cursor.execute(f"""
-                                SELECT DISTINCT {column_name}
-                                FROM {table_name}
-                                WHERE {column_name} IS NOT NULL
-                            """)
-                            distinct_vals = [row[0] for row in cursor.fetchall()]
-                            col_info['sampled_distinct_values'] = distinct_vals
-                        else:
-                            # More than 500 distinct values: pick 500 using TABLESAMPLE or LIMIT
-                            cursor.execute(f"""
-                                SELECT DISTINCT {column_name}
-                                FROM {table_name}
-                                WHERE {column_name} IS NOT NULL
-                                LIMIT 500
-                            """)
-                            distinct_vals = [row[0] for row in cursor.fetchall()]
-                            col_info['sampled_distinct_values'] = distinct_vals
-                    except Exception as e:
-                        print(f"Error fetching distinct values for column {column_name} in table {table_name}: {e}")
+            # Steps 2-4 run per table, each table on one connection
+            workers = max(1, min(workers, len(stale_tables)))
+            pool = None
+            if workers > 1:
+                pool = PostgreSQLConnectionPool(
+                    workers, database=self.current_db, user=self.user,
+                    password=self.password, host="localhost", port=self.port
+                )
 
-            cursor.close()
+            def collect(table_name):
+                if pool is None:
+                    return self._collect_table_info(self.connection, table_name, sampled, sample_rows, representative_values)
+                with pool.connection() as connection:
+                    return self._collect_table_info(connection, table_name, sampled, sample_rows, representative_values)
+
+            start_time = time.time()
+            collected = {}
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {executor.submit(collect, table_name): table_name for table_name in stale_tables}
+                    for num_done, future in enumerate(as_completed(futures), 1):
+                        table_name = futures[future]
+                        try:
+                            collected[table_name] = future.result()
+                            signatures[table_name] = current_signatures.get(table_name)
+                        except Exception as e:
+                            print(f"Error collecting metadata for table {table_name}: {e}")
+                            # keep the previous metadata (and signature, so the next refresh retries) of a failed table
+                            if table_name not in previous_metadata:
+                                collected[table_name] = {}
+                        print(f"Collected column info of {table_name} ({num_done}/{len(stale_tables)} tables, {time.time() - start_time:.1f}s)")
+            finally:
+                if pool is not None:
+                    pool.close_all()
+
+            # keep the information_schema order of the tables; dropped tables disappear
+            table_metadata = {}
+            for table_name in tables:
+                if table_name in collected:
+                    table_metadata[table_name] = collected[table_name]
+                else:
+                    table_metadata[table_name] = previous_metadata[table_name]
+                    signatures[table_name] = previous_signatures.get(table_name)
 
         except Exception as e:
             print(f"Error retrieving table metadata: {e}")
 
-        # Step 5: Write out to JSON file
+        # Step 5: Write out to JSON file, and the signatures the tables were collected at next to it
         try:
-            file_name = os.path.join(folder_path, "column_info.json")
             with open(file_name, 'w', encoding='utf-8') as json_file:
                 json.dump(table_metadata, json_file, ensure_ascii=False, indent=4, default=self.custom_json_serializer)
             print(f"Table data successfully saved to {file_name}")
+            if signatures:
+                with open(state_file_name, 'w', encoding='utf-8') as json_file:
+                    json.dump({"sampled": sampled, "representative_values": representative_values, "tables": signatures}, json_file, indent=4)
         except Exception as e:
             print(f"Error writing to JSON file: {e}")
 
+    def _load_column_info_state(self, file_name, state_file_name, sampled, representative_values):
+        """
+        (metadata, {table: signature}) of the previous collection, ({}, {}) if it is missing or was
+        collected in another mode (exact/sampled, first/representative values), in which case every table is recollected
+        """
+        try:
+            with open(file_name, 'r', encoding='utf-8') as json_file:
+                metadata = json.load(json_file)
+            with open(state_file_name, 'r', encoding='utf-8') as json_file:
+                state = json.load(json_file)
+        except (OSError, ValueError) as e:
+            print(f"No previous column info state to refresh from ({e}), collecting every table")
+            return {}, {}
+        if state.get("sampled") != sampled or state.get("representative_values", False) != representative_values:
+            print("The previous column info was collected in another mode, collecting every table")
+            return {}, {}
+        return metadata, state.get("tables", {})
+
+    def _table_sample(self, cursor, table_name, sample_rows):
+        """
+        (TABLESAMPLE clause reading about sample_rows rows, {column: distinct count from pg_stats})
+        of a table; the clause is empty for tables that are small or were never analyzed
+        """
+        cursor.execute("""
+            SELECT c.reltuples FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = %s;
+        """, (table_name,))
+        row = cursor.fetchone()
+        reltuples = float(row[0]) if row else 0.0
+
+        cursor.execute("""
+            SELECT attname, n_distinct FROM pg_stats
+            WHERE schemaname = 'public' AND tablename = %s;
+        """, (table_name,))
+        # negative n_distinct is a fraction of the rows, for columns whose distinct count grows with the table
+        distinct_counts = {
+            column_name: int(round(n_distinct if n_distinct >= 0 else -n_distinct * reltuples))
+            for column_name, n_distinct in cursor.fetchall()
+        }
+
+        if reltuples <= sample_rows:
+            return "", distinct_counts
+        return f" TABLESAMPLE SYSTEM ({100.0 * sample_rows / reltuples:.6f})", distinct_counts
+
+    def _representative_values(self, cursor, table_name, column_name, column_type, sample_clause, num_values=500):
+        """
+        Up to num_values distinct values of a column that cover its selectivity range evenly: every most
+        common value of pg_stats that holds more rows than one equi-depth bucket (frequency > 1/num_values),
+        plus equi-depth quantiles (percentile_disc, min and max included) over the table or its sample
+        for the remaining slots. Sorted by value; None if the column cannot be sorted or cast.
+        """
+        mcv = []
+        if column_type is not None:
+            cursor.execute(f"""
+                SELECT most_common_vals::text::{column_type}[], most_common_freqs FROM pg_stats
+                WHERE schemaname = 'public' AND tablename = %s AND attname = %s;
+            """, (table_name, column_name))
+            row = cursor.fetchone()
+            if row and isinstance(row[0], list) and row[1]:
+                mcv = [value for value, freq in zip(row[0], row[1]) if freq > 1.0 / num_values]
+
+        num_quantiles = max(num_values - len(mcv), 2)
+        fractions = ", ".join(f"{idx / (num_quantiles - 1):.6f}" for idx in range(num_quantiles))
+        cursor.execute(f"""
+            SELECT percentile_disc(ARRAY[{fractions}]) WITHIN GROUP (ORDER BY {column_name})
+            FROM {table_name}{sample_clause}
+            WHERE {column_name} IS NOT NULL
+        """)
+        quantiles = cursor.fetchone()[0]
+        if not isinstance(quantiles, list):
+            return None
+        return sorted(set(mcv) | set(quantiles))[:num_values]
+
+    def _collect_table_info(self, connection, table_name, sampled=False, sample_rows=100000, representative_values=False):
+        """ Column metadata of one table (steps 2-4 of get_column_info) over the given connection """
+        table_info = {}
+        connection.autocommit = True
+        cursor = connection.cursor()
+        try:
+            # Step 2: Get columns for the current table
+            cursor.execute(f"""
+                SELECT column_name, data_type
+                FROM information_schema.columns
+                WHERE table_name = '{table_name}'
+                ORDER BY ordinal_position;
+            """)
+            columns = cursor.fetchall()
+
+            # Initialize metadata structure
+            for column in columns:
+                column_name, column_type = column
+                table_info[column_name] = {
+                    'type': column_type,
+                    'min_value': None,
+                    'max_value': None,
+                    'distinct_count': 0,
+                    'sampled_distinct_values': []
+                }
+
+            # SQL type names of the columns, used to cast pg_stats values back to the column type
+            column_types = {}
+            if representative_values:
+                cursor.execute("""
+                    SELECT a.attname, format_type(a.atttypid, a.atttypmod) FROM pg_attribute a
+                    JOIN pg_class c ON c.oid = a.attrelid
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = 'public' AND c.relname = %s AND a.attnum > 0 AND NOT a.attisdropped;
+                """, (table_name,))
+                column_types = dict(cursor.fetchall())
+
+            sample_clause, stats_distinct_counts = "", {}
+            if sampled:
+                sample_clause, stats_distinct_counts = self._table_sample(cursor, table_name, sample_rows)
+
+            # Step 3: OPTIMIZED - Batch all min/max/distinct_count into ONE query per table
+            if columns:
+                # Build a single query that gets min, max, distinct count for all columns at once
+                select_parts = []
+                for column_name, _ in columns:
+                    select_parts.append(f"MIN({column_name}) AS min_{column_name}")
+                    select_parts.append(f"MAX({column_name}) AS max_{column_name}")
+                    if column_name in stats_distinct_counts:
+                        select_parts.append(f"NULL AS distinct_{column_name}")
+                    else:
+                        select_parts.append(f"COUNT(DISTINCT {column_name}) AS distinct_{column_name}")
+
+                combined_query = f"SELECT {', '.join(select_parts)} FROM {table_name}{sample_clause};"
+
+                try:
+                    cursor.execute(combined_query)
+                    result = cursor.fetchone()
+
+                    # Parse results - every 3 values correspond to one column (min, max, distinct_count)
+                    for idx, (column_name, _) in enumerate(columns):
+                        col_info = table_info[column_name]
+                        col_info['min_value'] = result[idx * 3]
+                        col_info['max_value'] = result[idx * 3 + 1]
+                        col_info['distinct_count'] = stats_distinct_counts.get(column_name, result[idx * 3 + 2])
+                except Exception as e:
+                    print(f"Error fetching batch metadata for table {table_name}: {e}")
+                    # Fallback to individual queries if batch query fails
+                    for column_name, _ in columns:
+                        try:
+                            cursor.execute(f"""
+                                SELECT MIN({column_name}), MAX({column_name}), COUNT(DISTINCT {column_name})
+                                FROM {table_name}{sample_clause};
+                            """)
+                            min_value, max_value, distinct_count = cursor.fetchone()
+                            col_info = table_info[column_name]
+                            col_info['min_value'] = min_value
+                            col_info['max_value'] = max_value
+                            col_info['distinct_count'] = stats_distinct_counts.get(column_name, distinct_count)
+                        except Exception as e2:
+                            print(f"Error fetching metadata for column {column_name}: {e2}")
+
+            # Step 4: Retrieve distinct values for each column
+            for column_name, _ in columns:
+                try:
+                    col_info = table_info[column_name]
+                    distinct_count = col_info['distinct_count']
+
+                    if distinct_count <= 500:
+                        # Get all distinct values
+                        cursor.execute(f"""
+                            SELECT DISTINCT {column_name}
+                            FROM {table_name}{sample_clause}
+                            WHERE {column_name} IS NOT NULL
+                        """)
+                        distinct_vals = [row[0] for row in cursor.fetchall()]
+                        col_info['sampled_distinct_values'] = distinct_vals
+                    else:
+                        distinct_vals = None
+                        if representative_values:
+                            try:
+                                distinct_vals = self._representative_values(cursor, table_name, column_name, column_types.get(column_name), sample_clause)
+                            except Exception as e:
+                                print(f"Error sampling representative values for column {column_name} in table {table_name}, using the first 500: {e}")
+                        if distinct_vals is not None:
+                            col_info['sampled_distinct_values'] = distinct_vals
+                            continue
+
+                        # More than 500 distinct values: pick 500 using TABLESAMPLE or LIMIT
+                        cursor.execute(f"""
+                            SELECT DISTINCT {column_name}
+                            FROM {table_name}{sample_clause}
+                            WHERE {column_name} IS NOT NULL
+                            LIMIT 500
+                        """)
+                        distinct_vals = [row[0] for row in cursor.fetchall()]
+                        col_info['sampled_distinct_values'] = distinct_vals
+                except Exception as e:
+                    print(f"Error fetching distinct values for column {column_name} in table {table_name}: {e}")
+        finally:
+            cursor.close()
+
+        return table_info
+
 
     @staticmethod
     def custom_json_serializer(obj):
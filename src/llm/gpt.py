@@ -1,5 +1,8 @@
-from openai import OpenAI, APIError, RateLimitError
-import re, json, tiktoken, concurrent.futures, time, threading
+from openai import OpenAI, AsyncOpenAI, APIError, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+import re, json, tiktoken, time, threading, asyncio, random
+import os, sqlite3, hashlib
+from collections import Counter
+from pathlib import Path
 
 # --- Add once, near the top ---------------------------------------------------
 # Cost per-1M tokens in USD (2025-07-02 price list; change if OpenAI updates)
@@ -12,11 +15,112 @@ _PRICES = {
 }
 # -----------------------------------------------------------------------------
 
+# errors worth retrying with backoff; anything else is a bug in the request and is raised at once
+_RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+_REASONING_MODELS = ["o1-preview", "o1-mini", "o3-mini", "o4-mini"]
+
+class TokenBucket:
+    """
+    Token-per-minute rate limiter shared by threads and coroutines.
+    A caller reserves the tokens of its prompt up front and waits until the bucket has refilled the deficit.
+    """
+    def __init__(self, tokens_per_minute):
+        self.capacity = float(tokens_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, num_tokens):
+        """ Take num_tokens from the bucket, return how many seconds the caller has to wait """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # a single prompt larger than the whole bucket must still get through eventually
+            self.tokens -= min(num_tokens, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, num_tokens):
+        wait_time = self.reserve(num_tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def acquire_async(self, num_tokens):
+        wait_time = self.reserve(num_tokens)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+class ResponseCache:
+    """
+    On-disk cache of raw LLM responses keyed by a hash of the full request (model, messages, parameters).
+    Keeps the max_entries most recently used responses.
+    """
+    def __init__(self, path, max_entries=20000):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, last_used REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(request, occurrence=0):
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False) + f"#{occurrence}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Cached response text of key, or None """
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+                return row[0]
+            except sqlite3.Error as e:
+                print(f"Error reading LLM response cache {self.path}: {e}")
+                return None
+
+    def put(self, key, content):
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, last_used) VALUES (?, ?, ?)",
+                    (key, content, time.time())
+                )
+                # evict the least recently used responses beyond max_entries
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing LLM response cache {self.path}: {e}")
+
 class GPT:
-    def __init__(self, api_key, api_base=None, model="gpt-4o"):
+    def __init__(self, api_key, api_base=None, model="gpt-4o", max_concurrency=8, tokens_per_minute=None, max_retries=8,
+                 use_cache=True, cache_path=None, cache_max_entries=20000):
+        """
+            Args:
+                max_concurrency: maximum number of requests in flight at the same time
+                tokens_per_minute: prompt-token budget per minute, None for no client-side rate limit
+                max_retries: attempts after a rate limit / transient error before giving up
+                use_cache: answer repeated requests from the on-disk response cache instead of the API
+                cache_path: SQLite file of the response cache, defaults to outputs/intermediate/llm_cache/responses.sqlite
+        """
         self.api_base = api_base
         self.api_key = api_key
         self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
         
         # ---- running totals --------------------------------------------------
         self.total_prompt_tokens      = 0
@@ -25,91 +129,202 @@ class GPT:
         # ---------------------------------------------------------------------
 
         self._lock = threading.Lock()      # guards the four totals above
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)   # bounds concurrent calls, synchronous and async together
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._encoding = None
 
-    def invoke_GPT_in_parallel(self, prompts, json_format=True):
-        completions = []
+        self.use_cache = use_cache
+        self.response_cache = None
+        if use_cache:
+            if cache_path is None:
+                cache_path = f"{Path(__file__).resolve().parents[2]}/outputs/intermediate/llm_cache/responses.sqlite"
+            self.response_cache = ResponseCache(cache_path, cache_max_entries)
+        # how often each request was sent in this process: the n-th repetition of a request maps to its
+        # own cache entry, so asking the same prompt twice in a run still yields two independent answers
+        self._request_occurrences = Counter()
+        self.cache_hits = 0
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.get_GPT_response_json, prompt, json_format): prompt for prompt in prompts}
-            for future in concurrent.futures.as_completed(futures):
-                completions.append(future.result())
+    @property
+    def client(self):
+        """ One synchronous client shared by all calls (and threads) """
+        with self._client_lock:
+            if self._client is None:
+                # retries are handled by our own backoff loop
+                self._client = (OpenAI(api_key=self.api_key, base_url=self.api_base, max_retries=0) if self.api_base 
+                                else OpenAI(api_key=self.api_key, max_retries=0))
+            return self._client
 
-        return completions
+    def invoke_GPT_in_parallel(self, prompts, json_format=True, use_cache=None):
+        """ Send all prompts concurrently (at most max_concurrency in flight) and return the completions in prompt order """
+        return asyncio.run(self._invoke_GPT_async(prompts, json_format, use_cache))
 
-    def get_GPT_response_json(self, prompt, json_format=True): # This function returns the GPT response, which can be specified to return json or string format
-        client = (OpenAI(api_key=self.api_key, base_url=self.api_base) if self.api_base 
-                    else OpenAI(api_key=self.api_key))
-        
-        # reasoning model
-        if self.model in ["o1-preview", "o1-mini", "o3-mini", "o4-mini"]:
-            try:
-                response = client.chat.completions.create(
-                    model = self.model,
-                    messages = [
-                        {
-                            "role": "developer",
-                            "content": [
-                                {
-                                "type": "text",
-                                "text": "You are an experienced Database Administrator (DBA) and you will create high-quality SQL templates."
-                                }
-                            ]
-                        },
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                },
-                            ],
-                        }
-                    ],
-                    response_format={
-                        "type": "json_object"
-                    },
-                    reasoning_effort="medium",
-                    store=False
-                )
+    async def _invoke_GPT_async(self, prompts, json_format=True, use_cache=None):
+        # the async client is bound to the event loop (asyncio.run makes a new one per batch), so every batch
+        # gets its own client; the concurrency limit is the instance-wide _semaphore shared with synchronous calls
+        client = (AsyncOpenAI(api_key=self.api_key, base_url=self.api_base, max_retries=0) if self.api_base 
+                    else AsyncOpenAI(api_key=self.api_key, max_retries=0))
+        try:
+            return await asyncio.gather(*[
+                self.get_GPT_response_json_async(client, prompt, json_format, use_cache) for prompt in prompts
+            ])
+        finally:
+            await client.close()
+
+    async def _acquire_slot(self):
+        """ Take one of the max_concurrency request slots of _semaphore without blocking the event loop """
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(0.05)
 
-            except RateLimitError as e:
-                wait_time = float(e.response.headers.get('Retry-After', 0.5))
-                print(f"Error: {e}. Rate limit hit. Waiting for {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
-                return self.get_GPT_response_json(prompt, json_format=True)
-            
-        else:  
-            if json_format: # json
+    async def get_GPT_response_json_async(self, client, prompt, json_format=True, use_cache=None):
+        request = self._build_request(prompt, json_format)
+        cache_key = self._cache_key(request, use_cache)
+        cached = self._cached_response(cache_key, json_format)
+        if cached is not None:
+            return cached
+
+        await self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire_async(self.count_tokens(prompt))
                 try:
-                    response = client.chat.completions.create(
-                        messages=[
-                            {"role": "system", "content": "You should output JSON."},
-                            {'role':'user', 'content':prompt}],
-                        model=self.model, 
-                        response_format={"type": "json_object"}, 
-                        temperature=0.1,
-                    )
-            
-                except RateLimitError as e:
-                    wait_time = float(e.response.headers.get('Retry-After', 0.5))
-                    print(f"Rate limit hit. Waiting for {wait_time} seconds before retrying...")
-                    time.sleep(wait_time)
-                    return self.get_GPT_response_json(prompt, json_format=True)
-                         
-            else: # string
-                try: 
-                    response = client.chat.completions.create(
-                        messages=[
-                            {'role':'user', 'content':prompt}],
-                        model=self.model, 
-                        temperature=0.1,     
-                    )
-                except RateLimitError as e:
-                    wait_time = float(e.response.headers.get('Retry-After', 0.5))
-                    print(f"Rate limit hit. Waiting for {wait_time} seconds before retrying...")
+                    response = await client.chat.completions.create(**request)
+                    break
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    wait_time = self._backoff_time(e, attempt)
+                    print(f"Error: {e}. Waiting for {wait_time:.1f} seconds before retrying...")
+                    await asyncio.sleep(wait_time)
+        finally:
+            self._semaphore.release()
+        return self._parse_response(response, json_format, cache_key)
+
+    def get_GPT_response_json(self, prompt, json_format=True, use_cache=None): # This function returns the GPT response, which can be specified to return json or string format
+        request = self._build_request(prompt, json_format)
+        cache_key = self._cache_key(request, use_cache)
+        cached = self._cached_response(cache_key, json_format)
+        if cached is not None:
+            return cached
+
+        with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                if self.token_bucket is not None:
+                    self.token_bucket.acquire(self.count_tokens(prompt))
+                try:
+                    response = self.client.chat.completions.create(**request)
+                    break
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    wait_time = self._backoff_time(e, attempt)
+                    print(f"Error: {e}. Waiting for {wait_time:.1f} seconds before retrying...")
                     time.sleep(wait_time)
-                    return self.get_GPT_response_json(prompt, json_format=True)
-                
+        return self._parse_response(response, json_format, cache_key)
+
+    def _build_request(self, prompt, json_format=True):
+        """ Arguments of chat.completions.create for a prompt """
+        # reasoning model
+        if self.model in _REASONING_MODELS:
+            return dict(
+                model = self.model,
+                messages = [
+                    {
+                        "role": "developer",
+                        "content": [
+                            {
+                            "type": "text",
+                            "text": "You are an experienced Database Administrator (DBA) and you will create high-quality SQL templates."
+                            }
+                        ]
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": prompt
+                            },
+                        ],
+                    }
+                ],
+                response_format={
+                    "type": "json_object"
+                },
+                reasoning_effort="medium",
+                store=False
+            )
+        elif json_format: # json
+            return dict(
+                messages=[
+                    {"role": "system", "content": "You should output JSON."},
+                    {'role':'user', 'content':prompt}],
+                model=self.model, 
+                response_format={"type": "json_object"}, 
+                temperature=0.1,
+            )
+        else: # string
+            return dict(
+                messages=[
+                    {'role':'user', 'content':prompt}],
+                model=self.model, 
+                temperature=0.1,     
+            )
+
+    def _cache_key(self, request, use_cache=None):
+        """ Response cache key of the next occurrence of request, None if caching is off """
+        if use_cache is None:
+            use_cache = self.use_cache
+        if not use_cache or self.response_cache is None:
+            return None
+        request_hash = ResponseCache.make_key(request)
+        with self._lock:
+            occurrence = self._request_occurrences[request_hash]
+            self._request_occurrences[request_hash] += 1
+        return ResponseCache.make_key(request, occurrence)
+
+    def _cached_response(self, cache_key, json_format=True):
+        if cache_key is None:
+            return None
+        raw = self.response_cache.get(cache_key)
+        if raw is None:
+            return None
+        try:
+            result = json.loads(raw) if json_format else raw
+        except json.JSONDecodeError:
+            return None
+        with self._lock:
+            self.cache_hits += 1
+        return result
+
+    def count_tokens(self, prompt):
+        """ Prompt size in tokens for the rate limiter (a rough estimate if the tokenizer is unavailable) """
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                print(f"Tokenizer unavailable ({e}), estimating prompt sizes")
+                self._encoding = False
+        if self._encoding is False:
+            return len(prompt) // 4 + 1
+        return len(self._encoding.encode(prompt, disallowed_special=()))
+
+    @staticmethod
+    def _backoff_time(error, attempt, base=0.5, cap=60.0):
+        """ Full-jitter exponential backoff, never shorter than the server's Retry-After """
+        wait_time = random.uniform(0, min(cap, base * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                wait_time = max(wait_time, float(response.headers.get('Retry-After', 0)))
+            except (TypeError, ValueError):
+                pass
+        return wait_time
+
+    def _parse_response(self, response, json_format=True, cache_key=None):
         # ③  pull usage numbers returned by the API ---------------------------
         usage = response.usage              # safe: OpenAI always returns this
         p_tok = usage.prompt_tokens
@@ -127,7 +342,11 @@ class GPT:
 
         # ⑥  prepare the return value exactly as you did before --------------
         raw = response.choices[0].message.content
-        return json.loads(raw) if json_format else raw
+        result = json.loads(raw) if json_format else raw
+        # only cache answers that could be parsed
+        if cache_key is not None:
+            self.response_cache.put(cache_key, raw)
+        return result
 
     def remove_html_tags(self, text):
         clean = re.compile('<.*?>')
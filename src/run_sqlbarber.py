@@ -6,82 +6,129 @@ from sqlbarber.prompts import SQL_GENERATION_TEMPLATE # this prompt template wou
 from sqlbarber.runner import SQLBarberRunner
 from pathlib import Path
 
-# user provides sql requirement and optimization constraint
-para = sys.argv
 
-cost_type = para[1]
-distribution = para[2]
-total_sqls = int(para[3])
-min_cost = int(para[4])
-max_cost = int(para[5])
-num_intervals = int(para[6])
-num_iterations = int(para[7])
-dbname = str(para[8])
+def main():
+    """
+    Entry point. Everything runs inside main() so that the processes spawned for parallel profiling,
+    which import this script as __mp_main__, do not parse argv, connect or generate templates again.
+    """
+    # user provides sql requirement and optimization constraint
+    # --resume: continue the last interrupted run with the same parameters from its latest checkpoint
+    # --sampled-metadata: collect the DB column information from pg_stats and table samples instead of full-table scans
+    # --refresh-metadata: recollect the DB column information of the tables that changed since it was collected
+    # --representative-values: sample the predicate values of large columns as quantiles and most common values
+    # --prepared-statements: probe the templates through server-side prepared statements instead of literal query text
+    # --card-estimator: (card target) skip EXPLAIN for probes whose pg_stats estimate is clearly outside the target range
+    # --profiling-workers=N: profile N templates concurrently in separate processes (default 1)
+    # --optimization-workers=N: optimize N (interval, template) pairs concurrently in each iteration (default 1)
+    # --optimizer=NAME: search predicate values with "smac" (default) or the in-process "surrogate" optimizer
+    # --structured-search: bisect monotone range and comparison predicates before running the optimizer
+    # --probe-batch-size=N: number of predicate values each optimizer proposes and EXPLAINs in one round trip (default 1)
+    resume = "--resume" in sys.argv
+    sampled_metadata = "--sampled-metadata" in sys.argv
+    refresh_metadata = "--refresh-metadata" in sys.argv
+    representative_values = "--representative-values" in sys.argv
+    use_prepared_statements = "--prepared-statements" in sys.argv
+    use_card_estimator = "--card-estimator" in sys.argv
+    structured_search = "--structured-search" in sys.argv
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv if arg.startswith("--") and "=" in arg)
+    profiling_workers = int(options.get("profiling-workers", 1))
+    optimization_workers = int(options.get("optimization-workers", 1))
+    optimizer = options.get("optimizer", "smac")
+    probe_batch_size = int(options.get("probe-batch-size", 1))
+    if optimizer not in ("smac", "surrogate"):
+        print(f"Unknown optimizer '{optimizer}', expected 'smac' or 'surrogate'.")
+        return
+    para = [arg for arg in sys.argv if not arg.startswith("--")]
 
-summary_name = f"{dbname}_{cost_type}_{min_cost}_{max_cost}_{num_intervals}_{distribution}"
+    cost_type = para[1]
+    distribution = para[2]
+    total_sqls = int(para[3])
+    min_cost = int(para[4])
+    max_cost = int(para[5])
+    num_intervals = int(para[6])
+    num_iterations = int(para[7])
+    dbname = str(para[8])
 
-# DBController: create an instance of PostgreSQLController from configuration file
-target_dbms = "postgres" 
-config_path = "./configs/postgres.ini" 
-db_controller = create_db_controller(target_dbms, config_path)
-db_controller._connect(dbname)
+    summary_name = f"{dbname}_{cost_type}_{min_cost}_{max_cost}_{num_intervals}_{distribution}"
 
-task_name = f"{target_dbms}_{dbname}"
+    # DBController: create an instance of PostgreSQLController from configuration file
+    target_dbms = "postgres" 
+    config_path = "./configs/postgres.ini" 
+    db_controller = create_db_controller(target_dbms, config_path)
+    db_controller._connect(dbname)
 
-# prepare the DB column information, this only need to be done one time for each database
-column_info_folder = f"{Path(__file__).resolve().parents[1]}/outputs/intermediate/db_meta_info/{task_name}/"
-if not os.path.exists(f"{column_info_folder}column_info.json"):
-    print(f"--- Column Information for {task_name} is not available, trying to get this information from the database. ---")
-    print("This could take some time, depending on the size of the database. But this only need to be done for one time and reused in the future for a given database.")
-    print("If there are significant changes to a database, please delete the file and re-execute this command.")
-    db_controller.get_column_info(column_info_folder)
-else:
-    print(f"DB column information loaded successfully from {column_info_folder}")
+    task_name = f"{target_dbms}_{dbname}"
 
-# user specify which LLM to invoke
-try:
-    api_key = os.environ['OPENAI_API_KEY']
-    print("API key loaded successfully")
-except KeyError:
-    print("OPENAI_API_KEY not found in environment variables")
-    api_key = None
-model = "o3-mini"
-gpt = GPT(api_key=api_key, model=model)
+    # prepare the DB column information, this only need to be done one time for each database
+    column_info_folder = f"{Path(__file__).resolve().parents[1]}/outputs/intermediate/db_meta_info/{task_name}/"
+    if not os.path.exists(f"{column_info_folder}column_info.json"):
+        print(f"--- Column Information for {task_name} is not available, trying to get this information from the database. ---")
+        print("This could take some time, depending on the size of the database. But this only need to be done for one time and reused in the future for a given database.")
+        print("If there are significant changes to a database, please re-execute this command with --refresh-metadata.")
+        db_controller.get_column_info(column_info_folder, sampled=sampled_metadata, representative_values=representative_values)
+    elif refresh_metadata:
+        print(f"--- Refreshing the column information of the changed tables of {task_name}. ---")
+        db_controller.get_column_info(column_info_folder, sampled=sampled_metadata, refresh=True, representative_values=representative_values)
+    else:
+        print(f"DB column information loaded successfully from {column_info_folder}")
 
-# user provides semantic requirements
-semantic_requirements = []
-semantic_requirements.append([3, "The query should have a nested query with aggregation, at least two predicate values to fill."])
-semantic_requirements.append([3, "The query should use aggregation, and have at least three predicate values to fill."])
-semantic_requirements.append([3, "The query should use group-by, and have at least two predicate values to fill."])
+    # user specify which LLM to invoke
+    try:
+        api_key = os.environ['OPENAI_API_KEY']
+        print("API key loaded successfully")
+    except KeyError:
+        print("OPENAI_API_KEY not found in environment variables")
+        api_key = None
+    model = "o3-mini"
+    gpt = GPT(api_key=api_key, model=model)
 
-template_generators = ["Naive", "Advanced"]
-template_generator = template_generators[1]
+    # user provides semantic requirements
+    semantic_requirements = []
+    semantic_requirements.append([3, "The query should have a nested query with aggregation, at least two predicate values to fill."])
+    semantic_requirements.append([3, "The query should use aggregation, and have at least three predicate values to fill."])
+    semantic_requirements.append([3, "The query should use group-by, and have at least two predicate values to fill."])
 
-# create SQLBarber Runner to use SQLBarber based on user requirement
-sqlbarber_runner = SQLBarberRunner(
-    task_name,
-        gpt,
-            template_generator, 
-                db_controller, 
-                    semantic_requirements, 
-                        total_sqls,
-                            min_cost,
-                                max_cost,
-                                    num_intervals,
-                                        target=cost_type,
-                                            summary_name=summary_name)
+    template_generators = ["Naive", "Advanced"]
+    template_generator = template_generators[1]
 
-# target sql distribution generation
-with open(f'{Path(__file__).resolve().parents[1]}/benchmark/query_cost_distribution/cost_distributions.json', 'r') as f:
-    target_distributions = json.load(f)
-target_distribution = target_distributions[distribution]
-sqlbarber_runner.generate_target_sql_distribution(distribution, interval_counts=target_distribution)
+    # create SQLBarber Runner to use SQLBarber based on user requirement
+    sqlbarber_runner = SQLBarberRunner(
+        task_name,
+            gpt,
+                template_generator, 
+                    db_controller, 
+                        semantic_requirements, 
+                            total_sqls,
+                                min_cost,
+                                    max_cost,
+                                        num_intervals,
+                                            target=cost_type,
+                                                summary_name=summary_name,
+                                                    resume=resume,
+                                                        use_prepared_statements=use_prepared_statements,
+                                                        profiling_workers=profiling_workers,
+                                                        optimization_workers=optimization_workers,
+                                                        optimizer=optimizer,
+                                                        structured_search=structured_search,
+                                                        use_card_estimator=use_card_estimator,
+                                                        probe_batch_size=probe_batch_size)
 
-# SQLBarber generates SQL satisfying user requirement
-sqlbarber_runner.generate_sql(
-    SQL_GENERATION_TEMPLATE, 
-        semantic_requirements, 
-            num_iterations, 
-                num_profiling = int(0.15 * total_sqls),
-                    generate_new_sql_tamplate=True,
-                        reuse_history=True)
\ No newline at end of file
+    # target sql distribution generation
+    with open(f'{Path(__file__).resolve().parents[1]}/benchmark/query_cost_distribution/cost_distributions.json', 'r') as f:
+        target_distributions = json.load(f)
+    target_distribution = target_distributions[distribution]
+    sqlbarber_runner.generate_target_sql_distribution(distribution, interval_counts=target_distribution)
+
+    # SQLBarber generates SQL satisfying user requirement
+    sqlbarber_runner.generate_sql(
+        SQL_GENERATION_TEMPLATE, 
+            semantic_requirements, 
+                num_iterations, 
+                    num_profiling = int(0.15 * total_sqls),
+                        generate_new_sql_tamplate=True,
+                            reuse_history=True)
+
+
+if __name__ == "__main__":
+    main()
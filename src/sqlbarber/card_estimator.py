@@ -0,0 +1,211 @@
+"""
+Local cardinality estimates from the DBMS's own column statistics, used to pre-screen
+candidate configs of the card target before they are sent to EXPLAIN
+"""
+
+import math
+import numpy as np
+
+# PostgreSQL's selfuncs.h defaults for columns without statistics
+DEFAULT_EQ_SEL = 0.005
+DEFAULT_INEQ_SEL = 1.0 / 3.0
+DEFAULT_RANGE_SEL = 0.005
+
+FLIPPED_OPERATORS = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "=", "<>": "<>", "!=": "!="}
+
+
+class CardinalityEstimator:
+    """
+    Selectivity of simple predicates (=, <>, <, <=, >, >=, BETWEEN) from most common values and
+    equi-depth histogram bounds, following the planner's eqsel/scalarineqsel, and the resulting
+    row estimate of every table under independence.
+    """
+
+    def __init__(self, column_statistics):
+        """
+            Args:
+                column_statistics: as returned by the dbms controller's get_column_statistics()
+        """
+        self.column_statistics = column_statistics or {}
+        self._columns = {}
+
+    def _column(self, table_name, column_name):
+        """ Statistics of a column with parsed MCVs and histogram bounds, None if unknown """
+        key = (table_name, column_name)
+        if key not in self._columns:
+            table_statistics = self.column_statistics.get(table_name)
+            statistics = table_statistics["columns"].get(column_name) if table_statistics else None
+            if statistics is None:
+                self._columns[key] = None
+            else:
+                mcv = statistics["most_common_vals"]
+                bounds = statistics["histogram_bounds"]
+                numeric = all(self._is_number(value) for value in mcv + bounds)
+                convert = float if numeric else str
+                self._columns[key] = {
+                    "numeric": numeric,
+                    "reltuples": table_statistics["reltuples"],
+                    "null_frac": statistics["null_frac"],
+                    "n_distinct": statistics["n_distinct"],
+                    "mcv": [convert(value) for value in mcv],
+                    "mcv_freqs": np.array(statistics["most_common_freqs"], dtype=np.float64),
+                    "bounds": np.array([convert(value) for value in bounds], dtype=np.float64 if numeric else object),
+                }
+        return self._columns[key]
+
+    @staticmethod
+    def _is_number(value):
+        try:
+            float(value)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def _value(column, value):
+        if column["numeric"]:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return str(value)
+
+    def _fraction_below(self, column, value):
+        """ Fraction of the histogram population below value, interpolated within a bucket for numbers """
+        bounds = column["bounds"]
+        if len(bounds) < 2:
+            return None
+        if value <= bounds[0]:
+            return 0.0
+        if value >= bounds[-1]:
+            return 1.0
+        if column["numeric"]:
+            bucket = int(np.searchsorted(bounds, value, side="right")) - 1
+            width = bounds[bucket + 1] - bounds[bucket]
+            position = (value - bounds[bucket]) / width if width > 0 else 0.5
+        else:
+            bucket = sum(1 for bound in bounds[1:] if bound <= value)
+            position = 0.5
+        return (bucket + position) / (len(bounds) - 1)
+
+    def _histogram_fraction(self, column):
+        """ Fraction of the rows that are neither NULL nor one of the most common values """
+        return max(1.0 - column["null_frac"] - float(column["mcv_freqs"].sum()), 0.0)
+
+    def selectivity(self, table_name, column_name, operator, value):
+        """ Selectivity of `column operator value` """
+        column = self._column(table_name, column_name)
+        if column is None:
+            return DEFAULT_EQ_SEL if operator == "=" else DEFAULT_INEQ_SEL
+        value = self._value(column, value)
+        if value is None:
+            return DEFAULT_INEQ_SEL
+
+        if operator in ("=", "<>", "!="):
+            if value in column["mcv"]:
+                equal = float(column["mcv_freqs"][column["mcv"].index(value)])
+            else:
+                n_distinct = column["n_distinct"] if column["n_distinct"] > 0 else -column["n_distinct"] * column["reltuples"]
+                equal = self._histogram_fraction(column) / max(n_distinct - len(column["mcv"]), 1.0)
+            return equal if operator == "=" else max(1.0 - column["null_frac"] - equal, 0.0)
+
+        compare = {
+            "<": lambda mcv: mcv < value, "<=": lambda mcv: mcv <= value,
+            ">": lambda mcv: mcv > value, ">=": lambda mcv: mcv >= value,
+        }.get(operator)
+        if compare is None:
+            return DEFAULT_INEQ_SEL
+        mcv_selectivity = sum(float(freq) for mcv, freq in zip(column["mcv"], column["mcv_freqs"]) if compare(mcv))
+        below = self._fraction_below(column, value)
+        if below is None:
+            histogram_selectivity = DEFAULT_INEQ_SEL
+        else:
+            histogram_selectivity = below if operator in ("<", "<=") else 1.0 - below
+        return mcv_selectivity + self._histogram_fraction(column) * histogram_selectivity
+
+    def range_selectivity(self, table_name, column_name, low, high):
+        """ Selectivity of `column BETWEEN low AND high` """
+        column = self._column(table_name, column_name)
+        if column is None:
+            return DEFAULT_RANGE_SEL
+        low, high = self._value(column, low), self._value(column, high)
+        if low is None or high is None:
+            return DEFAULT_RANGE_SEL
+        mcv_selectivity = sum(float(freq) for mcv, freq in zip(column["mcv"], column["mcv_freqs"]) if low <= mcv <= high)
+        below_low, below_high = self._fraction_below(column, low), self._fraction_below(column, high)
+        if below_low is None or below_high is None:
+            return mcv_selectivity + self._histogram_fraction(column) * DEFAULT_RANGE_SEL
+        return mcv_selectivity + self._histogram_fraction(column) * max(below_high - below_low, 0.0)
+
+    def log_rows(self, predicates):
+        """
+        Sum over the filtered tables of log(estimated rows), a monotone proxy of the plan cardinality.
+        predicates: list of (table, column, operator, value), with operator "between" and value (low, high) for ranges.
+        """
+        selectivities = {}
+        for table_name, column_name, operator, value in predicates:
+            if operator == "between":
+                selectivity = self.range_selectivity(table_name, column_name, *value)
+            else:
+                selectivity = self.selectivity(table_name, column_name, operator, value)
+            selectivities[table_name] = selectivities.get(table_name, 1.0) * selectivity
+
+        log_rows = 0.0
+        for table_name, selectivity in selectivities.items():
+            reltuples = self.column_statistics.get(table_name, {}).get("reltuples", 1.0)
+            log_rows += math.log(max(reltuples * selectivity, 1.0))
+        return log_rows
+
+
+class CardinalityScreen:
+    """
+    Calibrates CardinalityEstimator.log_rows against the cardinalities the DBMS reports for one
+    template (least squares of log(1 + card) on the estimate) and decides which configs are worth
+    an EXPLAIN: those predicted within a few residual standard deviations of the target range.
+    Until enough probes are calibrated, and for every explore_every-th rejected config, it lets the probe through.
+    """
+
+    def __init__(self, target_cost, min_observations=8, num_deviations=2.0, explore_every=10):
+        self.low, self.high = target_cost
+        self.min_observations = min_observations
+        self.num_deviations = num_deviations
+        self.explore_every = explore_every
+        self.features = []
+        self.log_cards = []
+        self.num_screened = 0
+        self._fit = None
+
+    def observe(self, feature, card):
+        if feature is None or card is None:
+            return
+        self.features.append(feature)
+        self.log_cards.append(math.log1p(max(card, 0.0)))
+        self._fit = None
+
+    def _calibration(self):
+        if self._fit is None and len(self.features) >= self.min_observations and np.ptp(self.features) > 0:
+            slope, intercept = np.polyfit(self.features, self.log_cards, 1)
+            residuals = np.array(self.log_cards) - (slope * np.array(self.features) + intercept)
+            self._fit = (slope, intercept, float(residuals.std()))
+        return self._fit
+
+    def predict(self, feature):
+        """ Calibrated cardinality of an estimate, None before calibration """
+        calibration = self._calibration()
+        if calibration is None or feature is None:
+            return None
+        slope, intercept, _ = calibration
+        return math.expm1(slope * feature + intercept)
+
+    def is_promising(self, feature):
+        calibration = self._calibration()
+        if calibration is None or feature is None:
+            return True
+        slope, intercept, deviation = calibration
+        predicted = slope * feature + intercept
+        margin = self.num_deviations * deviation
+        if math.log1p(max(self.low, 0.0)) - margin <= predicted <= math.log1p(self.high) + margin:
+            return True
+        self.num_screened += 1
+        # keep probing some rejected configs so that the calibration does not drift
+        return self.num_screened % self.explore_every == 0
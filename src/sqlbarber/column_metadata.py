@@ -0,0 +1,54 @@
+"""
+Process-level cache of the column metadata (column_info.json) read by every PredicateEnumerator
+"""
+
+import os
+import json
+import threading
+from types import MappingProxyType
+
+
+class ColumnMetadata:
+    """
+    Parses column_info.json once per process and file version and hands out one shared read-only
+    view of it: {table: {column: {'type', 'min_value', 'max_value', 'distinct_count', 'sampled_distinct_values', ...}}}.
+    Tables and columns are MappingProxyType views; the sampled value lists are shared as well and must not be modified.
+    A rewritten file (new mtime or size) is parsed again on the next load.
+    """
+
+    _views = {}
+    _views_lock = threading.Lock()
+
+    @staticmethod
+    def version(file_path):
+        """ (absolute path, mtime, size) of the file, None if it does not exist """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def load(cls, file_path):
+        """ The shared read-only view of the metadata in file_path, None if it cannot be read """
+        version = cls.version(file_path)
+        if version is None:
+            return None
+        with cls._views_lock:
+            if version not in cls._views:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as json_file:
+                        table_data = json.load(json_file)
+                except Exception as e:
+                    print(f"Error reading JSON file: {e}")
+                    return None
+                # drop the views of older versions of the same file
+                for key in [key for key in cls._views if key[0] == version[0]]:
+                    del cls._views[key]
+                cls._views[version] = MappingProxyType({
+                    table_name: MappingProxyType({
+                        column_name: MappingProxyType(column_meta) for column_name, column_meta in columns.items()
+                    })
+                    for table_name, columns in table_data.items()
+                })
+            return cls._views[version]
@@ -0,0 +1,109 @@
+"""
+Persistent cache of estimated costs, shared by all PredicateEnumerator instances of a process
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CostCache:
+    """
+    Maps hash(normalized query, target, statistics version) -> estimated cost vector.
+    Hits are served from an in-memory LRU, misses from SQLite on disk, so repeat probes are free
+    across iterations and across runs as long as the DBMS statistics do not change.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    # scanned left to right: a quoted literal (kept verbatim), a line comment or a run of whitespace
+    TOKEN_PATTERN = re.compile(r"('(?:[^']|'')*')|--[^\n]*|\s+")
+
+    def __init__(self, db_path, memory_size=100000, flush_every=256):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.flush_every = flush_every
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS costs (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+    @classmethod
+    def shared(cls, db_path, memory_size=100000):
+        """ One cache per file in each process (a forked child must not reuse its parent's SQLite connection) """
+        instance_key = (os.getpid(), db_path)
+        with cls._instances_lock:
+            if instance_key not in cls._instances:
+                cls._instances[instance_key] = cls(db_path, memory_size)
+            return cls._instances[instance_key]
+
+    @classmethod
+    def normalize_query(cls, query):
+        """ Drop comments, trailing semicolons and redundant whitespace outside of quoted literals """
+        normalized_query = cls.TOKEN_PATTERN.sub(lambda match: match.group(1) or " ", query)
+        return normalized_query.strip().rstrip(";").strip()
+
+    @classmethod
+    def make_key(cls, query, target, statistics_version):
+        normalized_query = cls.normalize_query(query)
+        return hashlib.sha1(f"{target}\0{statistics_version}\0{normalized_query}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Cached cost vector of key, or None """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key in self._pending:
+                return self._pending[key]
+            try:
+                row = self._db.execute("SELECT value FROM costs WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading cost cache {self.db_path}: {e}")
+                return None
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            self._pending[key] = value
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        """ Write buffered entries to disk """
+        with self._lock:
+            self._flush_locked()
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO costs (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in self._pending.items()]
+            )
+            self._db.commit()
+            self._pending = {}
+        except sqlite3.Error as e:
+            print(f"Error writing cost cache {self.db_path}: {e}")
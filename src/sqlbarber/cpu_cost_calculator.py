@@ -5,7 +5,6 @@ Based on PostgreSQL's internal CPU cost estimation formulas
 
 import re
 import math
-import json
 from typing import Any, Dict, List, Tuple, Optional
 
 
@@ -85,15 +84,7 @@ class CPUCostCalculator:
             JSON plan dictionary or None if error
         """
         try:
-            result = self.db_controller.execute_sql(f"EXPLAIN (FORMAT JSON) {sql}")
-            if result["error"] is None and result["result"]:
-                plan_json = result["result"][0][0]
-                # Handle both string and dict responses
-                if isinstance(plan_json, str):
-                    plan_json = json.loads(plan_json)
-                if isinstance(plan_json, list) and len(plan_json) > 0:
-                    return plan_json[0]
-                return plan_json
+            return self.db_controller.explain_many([sql])[0]
         except Exception as e:
             print(f"Error executing EXPLAIN JSON: {e}")
         return None
@@ -307,11 +298,23 @@ class CPUCostCalculator:
         Returns:
             Total CPU cost as a float, or None if error
         """
-        try:
-            plan = self.explain_json(sql)
-            if plan is None:
-                return None
+        plan = self.explain_json(sql)
+        if plan is None:
+            return None
+
+        return self.calculate_cpu_cost_from_plan(plan)
 
+    def calculate_cpu_cost_from_plan(self, plan: Dict[str, Any]) -> Optional[float]:
+        """
+        Calculate the CPU-only cost from an already fetched EXPLAIN (FORMAT JSON) plan.
+
+        Args:
+            plan: Plan dictionary as returned by explain_json
+
+        Returns:
+            Total CPU cost as a float, or None if error
+        """
+        try:
             total_cpu, breakdown = self.cpu_cost_node(plan["Plan"], self.gucs)
             return total_cpu
 
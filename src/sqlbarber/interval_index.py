@@ -0,0 +1,36 @@
+"""
+Vectorized assignment of costs to the equal-width cost intervals of a run
+"""
+
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    num_intervals equal-width intervals over [min_cost, max_cost].
+    Edge rule: every interval is half-open [lower, upper), except the last one, which also contains max_cost.
+    Costs that are None, NaN or outside [min_cost, max_cost] belong to no interval (index -1).
+    """
+
+    def __init__(self, min_cost, max_cost, num_intervals):
+        self.min_cost = min_cost
+        self.max_cost = max_cost
+        self.num_intervals = num_intervals
+        self.edges = np.linspace(min_cost, max_cost, num_intervals + 1)
+
+    def bounds(self, interval_index):
+        """ [lower, upper] cost bounds of an interval """
+        return [self.edges[interval_index], self.edges[interval_index + 1]]
+
+    def assign(self, costs):
+        """ Interval index of every cost, -1 for costs that fall in no interval """
+        values = np.array([np.nan if cost is None else cost for cost in costs], dtype=float)
+        indices = np.searchsorted(self.edges, values, side="right") - 1
+        indices[values == self.edges[-1]] = self.num_intervals - 1
+        indices[~((values >= self.edges[0]) & (values <= self.edges[-1]))] = -1
+        return indices
+
+    def counts(self, costs):
+        """ Number of costs in each interval """
+        indices = self.assign(costs)
+        return np.bincount(indices[indices >= 0], minlength=self.num_intervals)
@@ -0,0 +1,92 @@
+"""
+Target-independent record of the metrics of every probed query, so that a run with one
+target (card, cost, cpu) can reuse the probes of an earlier run with another target
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class MetricStore:
+    """
+    Stores, per SQL template, {final_query: {"config": {...}, "card": [...], "cost": [...], "cpu": [...]}}.
+    Templates are keyed by a hash of their text, so a template id reused for different SQL never mixes metrics.
+    Records probed by an initial profiling also carry "profiling_target", the target of that profiling run;
+    optimization probes are biased towards their cost interval and carry no tag.
+    """
+
+    # metrics that can be read from a single EXPLAIN (FORMAT JSON) plan
+    METRICS = ["card", "cost", "cpu"]
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        os.makedirs(self.folder_path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _file_name(self, sql_template):
+        template_hash = hashlib.sha1(sql_template.encode("utf-8")).hexdigest()
+        return os.path.join(self.folder_path, f"{template_hash}.json")
+
+    def load(self, sql_template):
+        """ Return the stored records of a template, in probing order """
+        file_name = self._file_name(sql_template)
+        if not os.path.exists(file_name):
+            return OrderedDict()
+        try:
+            with open(file_name, 'r', encoding='utf-8') as json_file:
+                return json.load(json_file, object_pairs_hook=OrderedDict)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading metric history {file_name}: {e}")
+            return OrderedDict()
+
+    def save(self, sql_template, records, profiling_target=None):
+        """
+        Merge new records into the stored ones of a template; profiling_target tags them as probes
+        of an initial profiling for that target. A query keeps its tag when it is probed again later.
+        """
+        if not records:
+            return
+        file_name = self._file_name(sql_template)
+        with self._lock:
+            existing_records = self.load(sql_template)
+            for query, record in records.items():
+                tag = profiling_target or existing_records.get(query, {}).get("profiling_target")
+                existing_records[query] = dict(record, profiling_target=tag) if tag else record
+
+            tmp_file_name = f"{file_name}.tmp"
+            with open(tmp_file_name, 'w', encoding='utf-8') as json_file:
+                json.dump(existing_records, json_file, ensure_ascii=False)
+            os.replace(tmp_file_name, file_name)
+
+    @staticmethod
+    def profiling_records(records, exclude_target=None, limit=None):
+        """ The first `limit` records probed by an initial profiling for a target other than exclude_target """
+        selected = OrderedDict()
+        for query, record in records.items():
+            tag = record.get("profiling_target")
+            if tag is None or tag == exclude_target:
+                continue
+            if limit is not None and len(selected) >= limit:
+                break
+            selected[query] = record
+        return selected
+
+    @staticmethod
+    def target_costs(records, target, cost_type):
+        """
+        The per-query final cost of `target` for every record, None where the metric was not captured.
+        Mirrors PredicateEnumerator.calculate_cost.
+        """
+        costs = []
+        for record in records.values():
+            values = record.get(target)
+            if not values or values[0] is None:
+                costs.append(None)
+            elif cost_type == "output_cost":
+                costs.append(values[0])
+            else:
+                costs.append(sum(values))
+        return costs
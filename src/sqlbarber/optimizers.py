@@ -0,0 +1,302 @@
+"""
+Optimizer backends for PredicateEnumerator.optimize.
+"smac" is the original SMAC HyperparameterOptimizationFacade (see PredicateEnumerator.optimize_with_smac);
+"surrogate" is the in-process SurrogateOptimizer below, which needs no Scenario, facade or output directory.
+"""
+
+import os
+import fcntl
+import tempfile
+import threading
+import numpy as np
+
+OPTIMIZERS = ["smac", "surrogate"]
+
+
+def knn_predict(train_positions, train_values, query_positions, num_neighbors):
+    """
+    Inverse-distance-weighted k-nearest-neighbour prediction of train_values at query_positions.
+    Returns (predictions, distance of every query to its nearest training point).
+    """
+    squared_distances = (
+        np.sum(query_positions ** 2, axis=1)[:, None]
+        + np.sum(train_positions ** 2, axis=1)[None, :]
+        - 2 * query_positions @ train_positions.T
+    )
+    distances = np.sqrt(np.maximum(squared_distances, 0))
+
+    k = min(num_neighbors, len(train_values))
+    neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    neighbor_distances = np.take_along_axis(distances, neighbors, axis=1)
+    weights = 1 / (neighbor_distances + 1e-9)
+    predictions = np.sum(weights * train_values[neighbors], axis=1) / np.sum(weights, axis=1)
+    return predictions, neighbor_distances.min(axis=1)
+
+
+class SurrogateOptimizer:
+    """
+    Ask/tell minimizer over the ordinal indices of a search space.
+    The first points come from a Latin hypercube design. Later points are the best of a batch of
+    random and locally perturbed candidates, ranked by an inverse-distance-weighted k-nearest-neighbour
+    prediction of the score minus an exploration bonus for candidates far from every observation.
+    Everything is vectorized over the candidates, so proposing a point takes milliseconds.
+    """
+
+    def __init__(self, sequences, seed=1, num_candidates=2000, num_neighbors=5, exploration=0.1, local_ratio=0.5, value_indices=None):
+        """
+            Args:
+                sequences: {hyperparameter name: ordered sequence of its values}
+                value_indices: [{value: index in its sequence}] in the order of sequences, e.g. the
+                    label_index of shared ValueDomains; built from sequences when omitted
+        """
+        self.names = list(sequences)
+        self.sequences = list(sequences.values())
+        if value_indices is None:
+            value_indices = [{value: idx for idx, value in enumerate(sequence)} for sequence in self.sequences]
+        self.value_index = list(value_indices)
+        self.sizes = np.array([len(sequence) for sequence in self.sequences], dtype=np.int64)
+        self.num_candidates = num_candidates
+        self.num_neighbors = num_neighbors
+        self.exploration = exploration
+        self.local_ratio = local_ratio
+        self.rng = np.random.default_rng(seed)
+
+        self._X = np.empty((0, len(self.names)), dtype=np.int64)
+        self._y = np.empty(0, dtype=np.float64)
+        self._seen = set()
+
+    @property
+    def space_size(self):
+        size = 1
+        for dimension_size in self.sizes:
+            size *= int(dimension_size)
+        return size
+
+    @property
+    def num_observations(self):
+        return len(self._y)
+
+    def encode(self, config):
+        """ Ordinal indices of a {name: value} config, None if a value is not in the search space """
+        indices = []
+        for name, value_index in zip(self.names, self.value_index):
+            idx = value_index.get(config.get(name))
+            if idx is None:
+                return None
+            indices.append(idx)
+        return np.array(indices, dtype=np.int64)
+
+    def decode(self, indices):
+        """ The {name: value} config of a vector of ordinal indices """
+        return {name: sequence[int(idx)] for name, sequence, idx in zip(self.names, self.sequences, indices)}
+
+    def tell(self, indices, scores):
+        """ Record the scores of evaluated points (one row of indices per point) """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, len(self.names))
+        self._X = np.vstack([self._X, indices])
+        self._y = np.concatenate([self._y, np.asarray(scores, dtype=np.float64)])
+        self._seen.update(map(tuple, indices.tolist()))
+
+    def ask(self, n=1, initial=False):
+        """ Up to n not yet evaluated points, as rows of ordinal indices """
+        n = min(n, self.space_size - len(self._seen))
+        if n <= 0 or len(self.names) == 0:
+            return np.empty((0, len(self.names)), dtype=np.int64)
+        if initial or self.num_observations < 2:
+            return self._latin_hypercube(n)
+        return self._propose(n)
+
+    def _unseen(self, candidates):
+        """ Distinct rows of candidates that were not evaluated yet """
+        candidates = np.unique(candidates, axis=0)
+        if not self._seen:
+            return candidates
+        mask = np.fromiter((tuple(row) not in self._seen for row in candidates.tolist()), dtype=bool, count=len(candidates))
+        return candidates[mask]
+
+    def _random(self, n):
+        return np.floor(self.rng.random((n, len(self.names))) * self.sizes).astype(np.int64)
+
+    def _all_points(self):
+        grids = np.meshgrid(*[np.arange(size) for size in self.sizes], indexing="ij")
+        return np.stack([grid.ravel() for grid in grids], axis=1)
+
+    def _latin_hypercube(self, n):
+        strata = np.stack([self.rng.permutation(n) for _ in self.names], axis=1)
+        points = np.floor((strata + self.rng.random(strata.shape)) / n * self.sizes).astype(np.int64)
+        points = self._unseen(points)
+        if len(points) < n:
+            points = self._fill(points, n)
+        # keep the design order random, np.unique sorted it
+        return points[self.rng.permutation(len(points))][:n]
+
+    def _fill(self, points, n):
+        """ Top up points with random unseen points, or with every unseen point of a small space """
+        if self.space_size <= self.num_candidates:
+            extra = self._all_points()
+        else:
+            extra = self._random(4 * n)
+        seen = set(map(tuple, points.tolist()))
+        extra = np.array([row for row in self._unseen(extra).tolist() if tuple(row) not in seen], dtype=np.int64).reshape(-1, len(self.names))
+        extra = extra[self.rng.permutation(len(extra))][:n - len(points)]
+        return np.vstack([points, extra])
+
+    def _candidates(self):
+        if self.space_size <= self.num_candidates:
+            return self._unseen(self._all_points())
+
+        num_local = int(self.num_candidates * self.local_ratio)
+        # perturb the best 10% of the observations by a few percent of every dimension
+        num_parents = max(1, int(0.1 * self.num_observations))
+        parents = self._X[np.argsort(self._y, kind="stable")[:num_parents]]
+        parents = parents[self.rng.integers(0, len(parents), num_local)]
+        steps = np.rint(self.rng.normal(0, 1, parents.shape) * np.maximum(1, 0.05 * self.sizes)).astype(np.int64)
+        local = np.clip(parents + steps, 0, self.sizes - 1)
+        return self._unseen(np.vstack([local, self._random(self.num_candidates - num_local)]))
+
+    def positions(self, indices):
+        """ Ordinal indices scaled to [0, 1] in every dimension """
+        return np.asarray(indices, dtype=np.float64) / np.maximum(self.sizes - 1, 1)
+
+    def _propose(self, n):
+        candidates = self._candidates()
+        if len(candidates) == 0:
+            return self._fill(np.empty((0, len(self.names)), dtype=np.int64), n)
+
+        predictions, nearest_distances = knn_predict(self.positions(self._X), self._y, self.positions(candidates), self.num_neighbors)
+        acquisition = predictions - self.exploration * nearest_distances / np.sqrt(len(self.names))
+        return candidates[np.argsort(acquisition, kind="stable")[:n]]
+
+    def ask_predicted(self, n, predict_scores):
+        """
+        Up to n not yet evaluated points with the best scores according to predict_scores,
+        a function from rows of ordinal indices to predicted scores (lower is better)
+        """
+        n = min(n, self.space_size - len(self._seen))
+        if n <= 0 or self.num_observations == 0:
+            return np.empty((0, len(self.names)), dtype=np.int64)
+        candidates = self._candidates()
+        if len(candidates) == 0:
+            return candidates
+        predicted_scores = np.asarray(predict_scores(candidates), dtype=np.float64)
+        return candidates[np.argsort(predicted_scores, kind="stable")[:n]]
+
+
+class CostSurrogate:
+    """
+    Per-template regression from predicate values to the raw estimated cost, independent of the
+    cost interval being optimized: an interval objective is derived by scoring predicted costs.
+    Observations are persisted as <folder>/<template hash>.npz, so every interval, worker process
+    and later optimization of a template starts from everything measured before.
+    Predictions are k-nearest-neighbour averages of log(1 + cost) in the ordinal index space.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, file_path, num_neighbors=5):
+        self.file_path = file_path
+        self.num_neighbors = num_neighbors
+        self.observations = {}
+        self._names = None
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, file_path):
+        """ One surrogate per file in each process """
+        instance_key = (os.getpid(), file_path)
+        with cls._instances_lock:
+            if instance_key not in cls._instances:
+                cls._instances[instance_key] = cls(file_path)
+            return cls._instances[instance_key]
+
+    def __len__(self):
+        return len(self.observations)
+
+    @property
+    def names(self):
+        """ Placeholder order of the value tuples, as given to the last load() """
+        return self._names
+
+    def load(self, names):
+        """ Merge observations written to disk by other enumerators or processes since the last load """
+        with self._lock:
+            self._names = list(names)
+            if not os.path.exists(self.file_path):
+                return
+            if os.path.getmtime(self.file_path) == self._loaded_mtime:
+                return
+            self._merge_from_disk()
+
+    def _merge_from_disk(self):
+        """ Add the stored observations not known yet; observations of this process take precedence """
+        try:
+            mtime = os.path.getmtime(self.file_path)
+            with np.load(self.file_path) as data:
+                stored_names = [str(name) for name in data["names"]]
+                if stored_names != self._names:
+                    print(f"Ignore surrogate {self.file_path}: it was built for placeholders {stored_names}")
+                    return
+                for values, cost in zip(data["values"].tolist(), data["costs"].tolist()):
+                    self.observations.setdefault(tuple(values), cost)
+            self._loaded_mtime = mtime
+        except FileNotFoundError:
+            return
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error reading surrogate {self.file_path}: {e}")
+
+    def add(self, values, cost):
+        """ Record the cost of a config, given as a tuple of its values in placeholder order """
+        if cost is None:
+            return
+        with self._lock:
+            self.observations[tuple(values)] = float(cost)
+
+    def save(self):
+        """
+        Merge the observations on disk, written meanwhile by other processes, with the ones of this
+        process and replace the file, under an exclusive lock on <file>.lock so that no writer loses
+        the observations of another
+        """
+        if self._names is None or not self.observations:
+            return
+        with self._lock:
+            folder_path = os.path.dirname(self.file_path)
+            os.makedirs(folder_path, exist_ok=True)
+            with open(f"{self.file_path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._merge_from_disk()
+                    values = np.array(list(self.observations.keys()), dtype=str).reshape(len(self.observations), len(self._names))
+                    costs = np.array(list(self.observations.values()), dtype=np.float64)
+                    fd, tmp_file_path = tempfile.mkstemp(suffix=".npz", dir=folder_path)
+                    try:
+                        with os.fdopen(fd, "wb") as tmp_file:
+                            np.savez_compressed(tmp_file, names=np.array(self._names, dtype=str), values=values, costs=costs)
+                        os.replace(tmp_file_path, self.file_path)
+                    except BaseException:
+                        if os.path.exists(tmp_file_path):
+                            os.remove(tmp_file_path)
+                        raise
+                    self._loaded_mtime = os.path.getmtime(self.file_path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def predict(self, optimizer, indices):
+        """ Predicted costs of rows of ordinal indices of optimizer's search space """
+        with self._lock:
+            observations = list(self.observations.items())
+        train_indices = []
+        train_costs = []
+        for values, cost in observations:
+            encoded = optimizer.encode(dict(zip(optimizer.names, values)))
+            if encoded is not None:
+                train_indices.append(encoded)
+                train_costs.append(cost)
+        if not train_indices:
+            return np.full(len(indices), np.nan)
+
+        log_costs = np.log1p(np.maximum(np.array(train_costs), 0))
+        predictions, _ = knn_predict(optimizer.positions(np.array(train_indices)), log_costs, optimizer.positions(indices), self.num_neighbors)
+        return np.expm1(predictions)
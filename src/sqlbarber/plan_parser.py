@@ -0,0 +1,28 @@
+"""
+Helpers to read estimates out of PostgreSQL EXPLAIN (FORMAT JSON) plans
+"""
+
+from typing import Any, Dict, Iterator, List
+
+
+def iter_plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every node of a plan tree in pre-order, i.e. the order in which
+    text EXPLAIN prints one line per node.
+    """
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        children = current.get("Plans") or []
+        stack.extend(reversed(children))
+
+
+def plan_cardinalities(plan: Dict[str, Any]) -> List[int]:
+    """Estimated rows of every plan node (the 'rows=' values of text EXPLAIN)"""
+    return [int(round(node.get("Plan Rows") or 0)) for node in iter_plan_nodes(plan["Plan"])]
+
+
+def plan_costs(plan: Dict[str, Any]) -> List[float]:
+    """Estimated total cost of every plan node; the first entry is the cost of the whole query"""
+    return [float(node.get("Total Cost") or 0.0) for node in iter_plan_nodes(plan["Plan"])]
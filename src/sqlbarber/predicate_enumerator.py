@@ -1,6 +1,7 @@
-import os, json, re, time
+import os, json, re, time, hashlib
 from smac import HyperparameterOptimizationFacade, Scenario, initial_design
 from ConfigSpace import (
+    Configuration,
     ConfigurationSpace,
     OrdinalHyperparameter,
 )
@@ -9,27 +10,58 @@ import numpy as np
 import os
 import matplotlib.pyplot as plt
 from smac.runhistory.runhistory import RunHistory
+from smac.runhistory.dataclasses import TrialValue
 from collections import OrderedDict
 from pathlib import Path
 from .cpu_cost_calculator import CPUCostCalculator
+from .plan_parser import plan_cardinalities, plan_costs
+from .metric_store import MetricStore
+from .cost_cache import CostCache
+from .optimizers import OPTIMIZERS, SurrogateOptimizer, CostSurrogate
+from .card_estimator import CardinalityScreen, FLIPPED_OPERATORS
+from .template_renderer import TemplateRenderer
+from .value_domain import ValueDomain
+from .column_metadata import ColumnMetadata
 
 class PredicateEnumerator:
-    def __init__(self, task_name, db_controller, template_id, sql_template, target_cost, file_path, seed=1, target="cost", cost_type="sum_cost"):
+    def __init__(self, task_name, db_controller, template_id, sql_template, target_cost, file_path, seed=1, target="cost", cost_type="sum_cost", use_prepared=False, metric_store=None, cost_cache=None, optimizer="smac", structured_search=False, card_estimator=None, batch_size=1):
         """
             Args:
                 target: can be "card", "cost" or "time"
+                use_prepared: probe with EXPLAIN EXECUTE on a server-side prepared statement of the template
+                metric_store: MetricStore that records card, cost and cpu of every probe for reuse by other targets
+                cost_cache: CostCache consulted before sending a probe to the DBMS
+                optimizer: "smac" (SMAC random-forest facade) or "surrogate" (in-process SurrogateOptimizer)
+                structured_search: before the optimizer, bisect range pairs and single comparison predicates
+                    on numeric columns, whose cost is roughly monotone in the range width or the value
+                card_estimator: CardinalityEstimator that pre-screens configs of the card target against
+                    the target range, so that only promising ones are sent to EXPLAIN
+                batch_size: number of configs asked from the optimizer at once; their plans are fetched
+                    in one batched EXPLAIN round trip before the results are told back together
         """
         self.cost_type = cost_type
         self.task_name = task_name
         self.db_controller = db_controller
         self.template_id = template_id
         self.sql_template = sql_template
+        self.renderer = TemplateRenderer.compile(sql_template)
         self.target_cost = target_cost
         self.seed = seed
-        self.value_mapping = {}
+        self.value_domains = {}
         self.cost_history = {}
+        self.metric_store = metric_store
+        self.metric_history = {}
+        self.cost_cache = cost_cache
+        self.statistics_version = None
+        self.prefetched_plans = {}
+        # card screen decisions taken while prefetching, reused by set_and_replay so each query is screened once
+        self.screen_decisions = {}
+        self.use_prepared = use_prepared
+        self.prepared_name = None
+        self.prepared_placeholders = []
         self.sql_execute_time = 0
         self.search_space = ConfigurationSpace()
+        self.column_info_path = file_path
         self.column_info = self.load_table_data_from_json(file_path)
 
         self.supported_targets = ["card", "cost", "time", "cpu"]
@@ -37,8 +69,26 @@ class PredicateEnumerator:
             raise ValueError(f"Invalid target '{target}'. Must be one of {self.supported_targets}.")
         self.target = target
 
-        # Initialize CPU cost calculator for cpu target
-        if self.target == "cpu":
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"Invalid optimizer '{optimizer}'. Must be one of {OPTIMIZERS}.")
+        self.optimizer = optimizer
+        self.structured_search = structured_search
+        self.batch_size = max(1, batch_size)
+        self.card_estimator = card_estimator
+        self.card_screen = None
+        self.screen_operators = {}
+        if card_estimator is not None and self.target == "card" and isinstance(target_cost, list):
+            self.card_screen = CardinalityScreen(target_cost)
+            self.screen_operators = self.placeholder_operators()
+
+        # Cached estimates are only valid for the statistics they were computed with; execution time is never cached
+        if self.cost_cache is not None and self.target != "time":
+            self.statistics_version = self.db_controller.get_statistics_version()
+        if self.statistics_version is None:
+            self.cost_cache = None
+
+        # Initialize CPU cost calculator for cpu target, or to capture cpu alongside card and cost
+        if self.target == "cpu" or (self.metric_store is not None and self.target != "time"):
             self.cpu_cost_calculator = CPUCostCalculator(self.db_controller)
 
         self._root = Path(__file__).resolve().parents[2]
@@ -46,20 +96,18 @@ class PredicateEnumerator:
         os.makedirs(os.path.dirname(self.result_path), exist_ok=True)
 
         self.cost_history_path = f"{self._root}/outputs/intermediate/cost_history/{self.target}/{self.task_name}"
+        # one cost surrogate per template and target, shared by every interval optimized for it
+        template_hash = hashlib.sha1(self.sql_template.encode("utf-8")).hexdigest()
+        self.surrogate_path = f"{self._root}/outputs/intermediate/surrogate/{self.task_name}/{template_hash}_{self.target}_{self.cost_type}.npz"
+        # learns from every probe of optimize(), whichever optimizer runs it
+        self.cost_surrogate = None
 
         self.queries = []
         self.costs = []
 
     def load_table_data_from_json(self, file_path):
-        """ Load table metadata from a JSON file """
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as json_file:
-                    table_data = json.load(json_file)
-                    return table_data
-            except Exception as e:
-                print(f"Error reading JSON file: {e}")
-                return None
+        """ Read-only table metadata of a JSON file, parsed once per process and shared by every enumerator """
+        return ColumnMetadata.load(file_path)
 
     def identify_placeholders(self):
         """
@@ -70,15 +118,12 @@ class PredicateEnumerator:
         and test if the resulting base column name is valid. If yes, we adopt that base column name.
         5. Returns a list of valid placeholders: ["table.column", ...].
         """
-        import re
-
         # --- Step 1: Load table_metadata from JSON file (or however it's supplied) ---
         table_metadata = self.column_info
             
         # --- Step 2: Extract placeholders from self.sql_template ---
         # e.g. placeholders might look like ["orders.o_totalprice_min", "orders.o_custkey_start", ...]
-        placeholder_pattern = re.compile(r"'?{{(\w+\.\w+)}}'?")
-        raw_placeholders = re.findall(placeholder_pattern, self.sql_template)
+        raw_placeholders = self.renderer.slot_names
 
         valid_placeholders = []
 
@@ -124,18 +169,17 @@ class PredicateEnumerator:
 
         return valid_placeholders
     
-    def get_distinct_values(self):
+    def get_value_domains(self):
         """
-        Get the distinct values of each placeholder from the precomputed JSON file
-        (rather than running new SQL queries).
-        Store the mapping {placeholder -> {str_value -> ori_value}} in self.value_mapping.
-        Returns {placeholder: [list_of_distinct_values]}
+        Get the ValueDomain of each placeholder from the precomputed JSON file
+        (rather than running new SQL queries); _start and _end placeholders share the domain of their column.
+        Store them in self.value_domains, which maps config labels back to the original values.
+        Returns {placeholder: ValueDomain}
         """
         # Load the precomputed column info from JSON
         table_metadata = self.column_info
 
         placeholders = self.identify_placeholders()
-        all_distinct_values = {}
 
         for placeholder in placeholders:
             # e.g. "table_name.column_name", or "table_name.column_name_start"
@@ -154,76 +198,30 @@ class PredicateEnumerator:
                 # Not found, skip or handle error
                 continue
 
-            # Read the pre-sampled distinct values from JSON
-            distinct_vals = table_metadata[table_name][column_name].get('sampled_distinct_values', [])
-
-            all_distinct_values[placeholder] = distinct_vals
-
-            # Build {str_value -> ori_value} mapping
-            self.value_mapping[placeholder] = {
-                str(value): value for value in distinct_vals
-            }
+            # Built once per column of column_info.json and shared by every enumerator
+            domain = ValueDomain.shared(self.column_info_path, table_name, column_name, table_metadata[table_name][column_name])
+            if domain is not None:
+                self.value_domains[placeholder] = domain
 
-        return all_distinct_values
+        return self.value_domains
 
     def define_search_space(self):
         """
             define search space, turn predicate values into ordinalhyperparameters
         """
 
-        columns_values = self.get_distinct_values()
-
-        for placeholder, distinct_values in columns_values.items():
-            table_name, column_name_with_suffix = placeholder.split('.')
-
-            if column_name_with_suffix.endswith('_start'):
-                column_name = column_name_with_suffix[:-6]
-            elif column_name_with_suffix.endswith('_end'):
-                column_name = column_name_with_suffix[:-4]
-            else:
-                column_name = column_name_with_suffix
-
-            if table_name in self.column_info and column_name in self.column_info[table_name]:
-                column_meta = self.column_info[table_name][column_name]
-                column_type = column_meta['type']
-
-                if column_type in ['integer', 'bigint', 'smallint', 'float', 'double precision', 'numeric', 'real']:
-                    # numerical columns
-                    if distinct_values:
-                        sorted_distinct_values = sorted(distinct_values)
-                        hyperparameter = OrdinalHyperparameter(
-                            name=placeholder, sequence=[str(value) for value in sorted_distinct_values]
-                        )
-                        self.search_space.add_hyperparameter(hyperparameter)
-
-                elif column_type in ['text', 'varchar', 'boolean', 'character', 'character varying', 'date']:
-                    # non-numerical columns
-                    if distinct_values:
-                        hyperparameter = OrdinalHyperparameter(
-                            name=placeholder, sequence=[str(value) for value in distinct_values]
-                        )
-                        self.search_space.add_hyperparameter(hyperparameter)
+        # numeric domains are sorted by value; the labels are the shared string forms of the values
+        for placeholder, domain in self.get_value_domains().items():
+            hyperparameter = OrdinalHyperparameter(name=placeholder, sequence=domain.labels)
+            self.search_space.add_hyperparameter(hyperparameter)
   
-    def set_and_replay(self, config, seed=0):
+    def resolve_values(self, config):
         """
-        Generate a SQL query based on the predicate values and the SQL template, 
-        then estimate the cost (number of estimated rows) using DBMS statistics.
-        
-        Args:
-            config: A ConfigSpace configuration object containing predicate values.
-            seed: Random seed (optional).
-        
-        Returns:
-            A score that represents the similarity between target_cost (or range) 
-            and estimated_cost. The score is transformed to a format suitable for 
-            Bayesian optimization (minimization).
+        Map every placeholder in `config` to the predicate value that replaces it,
+        keeping the _start value of a range below its _end value.
         """
+        values = OrderedDict()
 
-        sql_template = self.sql_template
-        values = []
-
-        # Prepare the final SQL query by replacing placeholders with actual values from `config`
-        final_query = sql_template
         for placeholder in config:
             if placeholder.endswith('start') or placeholder.endswith('end'):
                 if placeholder.endswith('start'):
@@ -234,10 +232,10 @@ class PredicateEnumerator:
                     another_name = f"{base_name}_start"
 
                 one_value = config[placeholder]
-                one_value = self.value_mapping[placeholder].get(one_value, one_value)
+                one_value = self.value_domains[placeholder].decode(one_value)
 
                 another_value = config[another_name]
-                another_value = self.value_mapping[another_name].get(another_value, another_value)
+                another_value = self.value_domains[another_name].decode(another_value)
 
                 if placeholder.endswith('start'):
                     value = min(one_value, another_value)
@@ -245,55 +243,191 @@ class PredicateEnumerator:
                     value = max(one_value, another_value)
             else:
                 value = config[placeholder]
-                value = self.value_mapping[placeholder].get(value, value)
+                value = self.value_domains[placeholder].decode(value)
 
             if isinstance(value, str):
                 value = value.strip()
-                values.append(value)
-                final_query = final_query.replace(f"{{{{{placeholder}}}}}", value)
-            else:
-                values.append(value)
-                final_query = final_query.replace(f"{{{{{placeholder}}}}}", str(value))
+            values[placeholder] = value
+
+        return values
+
+    def render_query(self, config, values=None):
+        """
+        Build the final SQL query by replacing the placeholders of the SQL template
+        with the predicate values chosen in `config`.
+        """
+        if values is None:
+            values = self.resolve_values(config)
+
+        # Fill the slots of the precompiled template with actual values from `config`
+        return self.renderer.render(values)
+
+    def prepare_template(self):
+        """
+        Turn the SQL template into a server-side prepared statement whose parameters $1..$n are the
+        placeholders of the search space, so that each probe only binds values instead of having the
+        DBMS parse the whole template again. Falls back to literal queries if this is not possible.
+        """
+        self.prepared_name = None
+        self.prepared_placeholders = []
+        if not self.use_prepared or self.target == "time":
+            return False
+
+        # built from the compiled template, so that the quoting of every slot is known
+        segments = list(self.renderer.segments)
+        parameters = {}
+        for slot, (placeholder, in_literal) in enumerate(zip(self.renderer.slot_names, self.renderer.slot_in_literal)):
+            if placeholder not in self.search_space:
+                # a placeholder that never gets a value
+                return False
+            if in_literal:
+                # only a whole literal '{{t.c}}' can become a parameter; '%{{t.c}}%' or '{{t.c}}%' stays literal SQL
+                if not (segments[slot].endswith("'") and segments[slot + 1].startswith("'")):
+                    return False
+                segments[slot] = segments[slot][:-1]
+                segments[slot + 1] = segments[slot + 1][1:]
+            if placeholder not in parameters:
+                parameters[placeholder] = len(parameters) + 1
+        if not parameters:
+            return False
+        parameterized_template = segments[0] + "".join(
+            f"${parameters[placeholder]}{segment}" for placeholder, segment in zip(self.renderer.slot_names, segments[1:])
+        )
+
+        name = "sqlbarber_" + re.sub(r"\W", "_", str(self.template_id)).lower()
+        if not self.db_controller.prepare_statement(name, parameterized_template):
+            print(f"Template {self.template_id} cannot be prepared, falling back to literal queries")
+            return False
+
+        self.prepared_name = name
+        self.prepared_placeholders = list(parameters)
+        return True
+
+    def probe_query(self, final_query, values):
+        """ The statement whose plan gives the estimates for final_query: EXECUTE on the prepared template if available """
+        if self.prepared_name is None:
+            return final_query
+        arguments = ", ".join(
+            "'" + str(values[placeholder]).replace("'", "''") + "'" for placeholder in self.prepared_placeholders
+        )
+        return f"EXECUTE {self.prepared_name}({arguments})"
+
+    def prefetch_plans(self, configs):
+        """
+        Fetch the EXPLAIN plans of many configurations with batched round trips, so that the
+        following set_and_replay calls for these configurations do not query the DBMS again.
+        Configs the card screen rejects are left out of the batch.
+        """
+        if self.target == "time":
+            # execution time has to be measured query by query
+            return
+
+        pending = {}
+        for config in configs:
+            values = self.resolve_values(config)
+            query = self.render_query(config, values)
+            if query in self.prefetched_plans:
+                continue
+            if self.card_screen is not None:
+                if query not in self.screen_decisions:
+                    self.screen_decisions[query] = self.card_screen.is_promising(self.screen_feature(values))
+                if not self.screen_decisions[query]:
+                    # set_and_replay scores it from the local estimate, its plan is never needed
+                    continue
+            cache_key = self.cost_cache_key(query)
+            if cache_key is not None and self.cost_cache.get(cache_key) is not None:
+                continue
+            pending[query] = self.probe_query(query, values)
+        if not pending:
+            return
+
+        start_time = time.time()
+        plans = self.db_controller.explain_many(list(pending.values()))
+        end_time = time.time()
+        self.sql_execute_time += (end_time - start_time) / 60
+
+        for query, plan in zip(pending, plans):
+            if plan is not None:
+                self.prefetched_plans[query] = plan
+
+    def screen_feature(self, values):
+        """ Local log-cardinality estimate of the predicate values, the feature of the card screen """
+        return self.card_estimator.log_rows(self.card_predicates(values))
+
+    def cost_cache_key(self, final_query):
+        """ Key of final_query in the cost cache, None if caching is disabled """
+        if self.cost_cache is None:
+            return None
+        return CostCache.make_key(final_query, self.target, self.statistics_version)
+
+    def fetch_plan(self, final_query, values):
+        """
+        Return the EXPLAIN (FORMAT JSON) plan of final_query, taking it from the prefetched plans
+        when available so that each query costs at most one round trip. None if EXPLAIN fails.
+        """
+        plan = self.prefetched_plans.pop(final_query, None)
+        if plan is not None:
+            return plan
+
+        start_time = time.time()
+        plan = self.db_controller.explain_many([self.probe_query(final_query, values)])[0]
+        end_time = time.time()
+        self.sql_execute_time += (end_time - start_time) / 60
+        return plan
+
+    def estimates_from_plan(self, plan, target=None):
+        """ Derive the per-node estimates of a target (default: the current one) from an EXPLAIN (FORMAT JSON) plan """
+        target = target or self.target
+        if target == "card":
+            return plan_cardinalities(plan)
+        elif target == "cost":
+            return plan_costs(plan)
+        elif target == "cpu":
+            cpu_cost = self.cpu_cost_calculator.calculate_cpu_cost_from_plan(plan)
+            return [cpu_cost] if cpu_cost is not None else None
+        raise ValueError(f"Target '{target}' cannot be derived from an EXPLAIN plan.")
+
+    def metrics_from_plan(self, plan, config):
+        """ All metrics of MetricStore.METRICS for one plan, together with the config that produced it """
+        record = {"config": {placeholder: config[placeholder] for placeholder in config}}
+        for metric in MetricStore.METRICS:
+            record[metric] = self.estimates_from_plan(plan, metric)
+        return record
+
+    def set_and_replay(self, config, seed=0, screen=True):
+        """
+        Generate a SQL query based on the predicate values and the SQL template, 
+        then estimate the cost (number of estimated rows) using DBMS statistics.
         
-        # Use EXPLAIN to get the estimated cost
-        explain_query = f"EXPLAIN {final_query};"
+        Args:
+            config: A ConfigSpace configuration object containing predicate values.
+            seed: Random seed (optional).
+            screen: let the card screen skip configs predicted far from the target range.
+        
+        Returns:
+            A score that represents the similarity between target_cost (or range) 
+            and estimated_cost. The score is transformed to a format suitable for 
+            Bayesian optimization (minimization).
+        """
+        values = self.resolve_values(config)
+        final_query = self.render_query(config, values)
+
         execute_query = f"{final_query};"
 
+        screen_feature = None
+        if self.card_screen is not None:
+            screen_feature = self.screen_feature(values)
+            promising = self.screen_decisions.pop(final_query, None)
+            if promising is None:
+                promising = not screen or self.card_screen.is_promising(screen_feature)
+            if screen and not promising:
+                # predicted far outside the target range: score the local estimate instead of running EXPLAIN
+                return self.calculate_performance(self.target_cost, self.card_screen.predict(screen_feature))
+
         try:
             estimated_costs = []
 
-            if self.target == "card":
-                # Execute the EXPLAIN query to get the execution plan
-                start_time = time.time()
-                result = self.db_controller.execute_sql(explain_query)["result"]
-                end_time = time.time()
-                self.sql_execute_time += (end_time - start_time) / 60
-
-                # Parse the result to extract the estimated number of rows (cost)
-                if result and len(result) > 0:
-                    for line in result:
-                        explain_line = line[0]  
-                        match = re.search(r'rows=(\d+)', explain_line)
-                        if match:
-                            estimated_costs.append(int(match.group(1)))
-
-            elif self.target == "cost":
-                # Execute the EXPLAIN query to get the execution plan
-                start_time = time.time()
-                result = self.db_controller.execute_sql(explain_query)["result"]
-                end_time = time.time()
-                self.sql_execute_time += (end_time - start_time) / 60
-
-                # Parse the result to extract the total cost for each relevant line
-                if result and len(result) > 0:
-                    for line in result:
-                        explain_line = line[0]  # Assume the line text is in the first element
-                        # Use regex to match the cost pattern and capture the total cost after ".."
-                        match = re.search(r'cost=\d+\.\d+\.\.(\d+\.\d+)', explain_line)
-                        if match:
-                            estimated_costs.append(float(match.group(1)))  # Extract and store the total cost as a float
-
-            elif self.target == "time":
+            if self.target == "time":
             # Execute the query to get the execution time
                 start_time = time.time()
                 result = self.db_controller.execute_sql(execute_query)["result"]
@@ -301,23 +435,41 @@ class PredicateEnumerator:
                 sql_execution_time = end_time - start_time
                 estimated_costs.append(sql_execution_time)
 
-            elif self.target == "cpu":
-            # Calculate CPU cost using the CPU cost calculator
-                start_time = time.time()
-                cpu_cost = self.cpu_cost_calculator.calculate_cpu_cost(final_query)
-                end_time = time.time()
-                self.sql_execute_time += (end_time - start_time) / 60
-
-                if cpu_cost is not None:
-                    estimated_costs.append(cpu_cost)
+            else:
+                cache_key = self.cost_cache_key(final_query)
+                cached_costs = self.cost_cache.get(cache_key) if cache_key is not None else None
+                if cached_costs is not None:
+                    # probed before, in this or an earlier run, under the same DBMS statistics
+                    self.prefetched_plans.pop(final_query, None)
+                    plan = None
+                    estimated_costs = cached_costs
                 else:
+                    # card, cost and cpu are all derived from the same EXPLAIN (FORMAT JSON) plan
+                    plan = self.fetch_plan(final_query, values)
+
+                if plan is not None and self.metric_store is not None:
+                    # one plan yields every metric, keep them all for runs with another target
+                    self.metric_history[final_query] = self.metrics_from_plan(plan, config)
+                    estimated_costs = self.metric_history[final_query][self.target]
+                elif plan is not None:
+                    estimated_costs = self.estimates_from_plan(plan)
+                elif self.target == "cpu" and cached_costs is None:
                     # If CPU cost calculation fails, return high penalty
                     return 1.0
 
+                if estimated_costs is None:
+                    return 1.0
+                if plan is not None and cache_key is not None:
+                    self.cost_cache.put(cache_key, estimated_costs)
+
             self.cost_history[final_query] = estimated_costs
             estimated_cost = self.calculate_cost(estimated_costs)
+            if self.card_screen is not None:
+                self.card_screen.observe(screen_feature, estimated_cost)
             self.queries.append(final_query)
             self.costs.append(estimated_cost)
+            if self.cost_surrogate is not None:
+                self.cost_surrogate.add(tuple(config[name] for name in self.cost_surrogate.names), estimated_cost)
 
             # Handle single value vs range target_cost
             transformed_score = self.calculate_performance(self.target_cost, estimated_cost)
@@ -355,11 +507,16 @@ class PredicateEnumerator:
                 
                 runhistory_file = os.path.join(folder_path, "runhistory.json")
                 if os.path.exists(runhistory_file):
-                    original_runhistory = RunHistory()
-                    original_runhistory.update_from_json(runhistory_file, self.search_space)
-                    
-                    cost_file = f"{self.cost_history_path}/{self.template_id}_{self.target_cost[0]}_to_{self.target_cost[1]}.json"
-                    costs = self.read_cost(cost_file)
+                    try:
+                        original_runhistory = RunHistory()
+                        original_runhistory.update_from_json(runhistory_file, self.search_space)
+
+                        cost_file = f"{self.cost_history_path}/{self.template_id}_{self.target_cost[0]}_to_{self.target_cost[1]}.json"
+                        costs = self.read_cost(cost_file)
+                    except Exception as e:
+                        # another interval of this template may be optimized concurrently and still writing its files
+                        print(f"Skip runhistory {runhistory_file}: {e}")
+                        continue
                     
                     for idx, (trial_key, trial_value) in enumerate(original_runhistory.items()):
                         config = original_runhistory.ids_config[trial_key.config_id]
@@ -367,6 +524,20 @@ class PredicateEnumerator:
                         new_performance = self.calculate_performance(self.target_cost, estimated_cost)
                         new_runhistory.add(config=config, cost=new_performance)
 
+        # Source 3: without a profiling runhistory of this run, use the probes recorded by earlier runs,
+        # possibly made for another target
+        if not os.path.exists(initial_sampling_file) and self.metric_store is not None and self.target != "time":
+            records = self.metric_store.load(self.sql_template)
+            costs = MetricStore.target_costs(records, self.target, self.cost_type)
+            for record, estimated_cost in zip(records.values(), costs):
+                try:
+                    config = Configuration(self.search_space, values=record["config"])
+                except Exception:
+                    # the recorded values are no longer part of the search space
+                    continue
+                new_performance = self.calculate_performance(self.target_cost, estimated_cost)
+                new_runhistory.add(config=config, cost=new_performance)
+
         return new_runhistory
     
     def calculate_performance(self, target_cost, estimated_cost):
@@ -395,15 +566,49 @@ class PredicateEnumerator:
         return transformed_score
 
     def optimize(self, name, trials_number, initial_config_number, reuse_history=True):
-        retrain_after = 20
-        retries = 50
         self.cost_history = {}
+        self.metric_history = {}
         self.define_search_space()
+        self.prepare_template()
 
         space_size = self.search_space.estimate_size()
+        profiling = trials_number == initial_config_number + 1
+        self.cost_surrogate = CostSurrogate.shared(self.surrogate_path)
+        self.cost_surrogate.load(self.search_space.get_hyperparameter_names())
+
+        num_structured_probes = 0
+        if self.structured_search and not profiling and isinstance(self.target_cost, list):
+            num_structured_probes = self.monotone_search(trials_number)
+            trials_number = max(trials_number - num_structured_probes, 1 if self.optimizer == "smac" else 0)
+
+        if self.optimizer == "surrogate":
+            trials_number = self.optimize_with_surrogate(trials_number, initial_config_number, reuse_history and not profiling, space_size)
+        else:
+            trials_number = self.optimize_with_smac(name, trials_number, initial_config_number, reuse_history, space_size, profiling)
+
+        if profiling:
+            self.store_costs(f"{self.cost_history_path}", "initial_sampling")
+            new_costs = None
+        else:
+            new_costs = self.store_costs(f"{self.cost_history_path}")
+
+        if self.metric_store is not None:
+            # only the probes of a profiling are a sample another target's profiling can reuse
+            self.metric_store.save(self.sql_template, self.metric_history, profiling_target=self.target if profiling else None)
+        if self.cost_cache is not None:
+            self.cost_cache.flush()
+        self.cost_surrogate.save()
+
+        trials_number += num_structured_probes
+        return new_costs, space_size - trials_number # return the costs of newly generated quereis and the remainng space size
+
+    def optimize_with_smac(self, name, trials_number, initial_config_number, reuse_history, space_size, profiling):
+        """ Run the SMAC facade on set_and_replay, return the number of trials of the scenario """
+        retrain_after = 20
+        retries = 50
 
         # initial profiling
-        if trials_number == initial_config_number + 1:
+        if profiling:
             runhistory = None
             if space_size < trials_number:
                 trials_number = space_size
@@ -423,6 +628,21 @@ class PredicateEnumerator:
                 trials_number = space_size - history_length
                 initial_config_number = int(0.2 * trials_number) if not reuse_history else 0
 
+        # configs the cost surrogate predicts in the target interval start the run, as in optimize_with_surrogate
+        seed_configs = []
+        if not profiling and len(self.cost_surrogate) > 0:
+            new_trials = trials_number - (len(runhistory) if runhistory is not None else 0)
+            # the default configuration is always part of the initial design
+            num_seeds = min(max(1, new_trials // 4), trials_number - initial_config_number - 1)
+            if num_seeds > 0:
+                optimizer = self.new_surrogate_optimizer()
+                self.tell_surrogate_history(optimizer)
+                seed_configs = [
+                    Configuration(self.search_space, values=optimizer.decode(row))
+                    for row in self.predicted_indices(optimizer, num_seeds)
+                ]
+                self.prefetch_plans(seed_configs)
+
         scenario = Scenario(
             configspace=self.search_space,
             name=name,
@@ -436,8 +656,19 @@ class PredicateEnumerator:
             scenario,
             n_configs=initial_config_number,
             max_ratio=1,  # set this to a value close to 1 to get exact initial_configs as specified
+            additional_configs=seed_configs,
         )
 
+        if initial_config_number > 0:
+            # a fresh design with the same seed yields the same configurations SMAC will ask for,
+            # so their plans can be fetched in a few batched round trips up front
+            prefetch_design = initial_design.LatinHypercubeInitialDesign(
+                scenario,
+                n_configs=initial_config_number,
+                max_ratio=1,
+            )
+            self.prefetch_plans(prefetch_design.select_configurations())
+
         """
             HyperparameterOptimizationFacade uses random forest as surrogate model
             however there is an implementation issue: only eupport categorical parameters with only 128 values
@@ -465,15 +696,286 @@ class PredicateEnumerator:
                 config = runhistory.ids_config[trial_key.config_id]
                 smac.runhistory.add(config=config, cost=trial_value.cost)
 
-        smac.optimize()
-
-        if trials_number == initial_config_number + 1:
-            self.store_costs(f"{self.cost_history_path}", "initial_sampling")
-            new_costs = None
+        if self.batch_size > 1:
+            self.run_smac_in_batches(smac)
         else:
-            new_costs = self.store_costs(f"{self.cost_history_path}")
+            smac.optimize()
 
-        return new_costs, space_size - trials_number # return the costs of newly generated quereis and the remainng space size
+        return trials_number
+
+    def run_smac_in_batches(self, smac):
+        """
+        Replace smac.optimize() by an ask/tell loop: ask for batch_size trials, fetch the plans of those the
+        card screen lets through in one batched round trip, evaluate them and tell SMAC all results,
+        then save the run once at the end
+        """
+        while smac.optimizer.remaining_trials > 0:
+            trial_infos = []
+            for _ in range(min(self.batch_size, smac.optimizer.remaining_trials)):
+                try:
+                    trial_infos.append(smac.ask())
+                except StopIteration:
+                    # the intensifier has nothing left to propose
+                    break
+            if not trial_infos:
+                break
+            # screened-out trials are scored from their local estimate and never reach explain_many
+            self.prefetch_plans([trial_info.config for trial_info in trial_infos])
+            for trial_info in trial_infos:
+                score = self.set_and_replay(trial_info.config, seed=trial_info.seed)
+                smac.tell(trial_info, TrialValue(cost=score), save=False)
+        smac.optimizer.save()
+
+    def surrogate_history(self):
+        """
+        Earlier (config values, cost) observations of this template: the ones of its cost surrogate,
+        plus the probes recorded in the metric store, possibly for another target
+        """
+        observations = dict(self.cost_surrogate.observations)
+        if self.metric_store is not None and self.target != "time":
+            records = self.metric_store.load(self.sql_template)
+            costs = MetricStore.target_costs(records, self.target, self.cost_type)
+            for record, estimated_cost in zip(records.values(), costs):
+                values = tuple(record["config"].get(name) for name in self.search_space.get_hyperparameter_names())
+                observations.setdefault(values, estimated_cost)
+        return observations
+
+    def new_surrogate_optimizer(self):
+        """ A SurrogateOptimizer over the shared value domains of the search space """
+        names = self.search_space.get_hyperparameter_names()
+        return SurrogateOptimizer(
+            OrderedDict((name, self.value_domains[name].labels) for name in names),
+            seed=self.seed,
+            value_indices=[self.value_domains[name].label_index for name in names],
+        )
+
+    def tell_surrogate_history(self, optimizer):
+        """ Tell the optimizer every earlier observation of the template, rescored for the current target_cost """
+        history_indices = []
+        history_scores = []
+        for values, estimated_cost in self.surrogate_history().items():
+            indices = optimizer.encode(dict(zip(optimizer.names, values)))
+            if indices is not None:
+                history_indices.append(indices)
+                history_scores.append(self.calculate_performance(self.target_cost, estimated_cost))
+        if history_indices:
+            optimizer.tell(history_indices, history_scores)
+
+    def predicted_indices(self, optimizer, n):
+        """ Up to n configs not evaluated yet whose cost predicted by the cost surrogate scores best for target_cost """
+        return optimizer.ask_predicted(
+            n,
+            lambda candidates: [self.calculate_performance(self.target_cost, cost) for cost in self.cost_surrogate.predict(optimizer, candidates)]
+        )
+
+    def evaluate_configs(self, optimizer, indices):
+        """ Probe the configs of a batch of ordinal index rows and tell the optimizer their scores """
+        configs = [optimizer.decode(row) for row in indices]
+        self.prefetch_plans(configs)
+        scores = [self.set_and_replay(config) for config in configs]
+        optimizer.tell(indices, scores)
+
+    def optimize_with_surrogate(self, trials_number, initial_config_number, reuse_history, space_size):
+        """
+        Run the in-process SurrogateOptimizer on set_and_replay, return the number of configs evaluated.
+        With reuse_history, every earlier observation of the template seeds the optimizer (rescored
+        for the current target_cost), the first quarter of the trials goes to the configs whose
+        predicted cost scores best for target_cost, and trials_number new configs are evaluated in total.
+        """
+        optimizer = self.new_surrogate_optimizer()
+
+        num_evaluated = 0
+        if reuse_history:
+            self.tell_surrogate_history(optimizer)
+            initial_config_number = 0
+
+            if len(self.cost_surrogate) > 0 and trials_number > 0:
+                # configs predicted to land in the target interval, probed in batched round trips
+                indices = self.predicted_indices(optimizer, max(1, trials_number // 4))
+                self.evaluate_configs(optimizer, indices)
+                num_evaluated += len(indices)
+
+        if initial_config_number > 0:
+            # the initial design is known up front, so its plans are fetched in batched round trips
+            indices = optimizer.ask(initial_config_number, initial=True)
+            self.evaluate_configs(optimizer, indices)
+            num_evaluated += len(indices)
+
+        while num_evaluated < trials_number:
+            indices = optimizer.ask(min(self.batch_size, trials_number - num_evaluated))
+            if len(indices) == 0:
+                # every config of the search space has been evaluated
+                break
+            self.evaluate_configs(optimizer, indices)
+            num_evaluated += len(indices)
+
+        return optimizer.num_observations
+
+    def sorted_placeholders(self):
+        """ Placeholders of numeric columns, whose ordinal sequence is sorted by value """
+        return [placeholder for placeholder in self.search_space.get_hyperparameter_names() if self.value_domains[placeholder].numeric]
+
+    def placeholder_operators(self):
+        """
+        {placeholder: comparison operator} for placeholders compared with =, <>, !=, <, <=, > or >= in the
+        template, written as `column operator value` (operators after the placeholder are flipped)
+        """
+        operators = {}
+        for placeholder in self.renderer.placeholders:
+            escaped = re.escape(f"{{{{{placeholder}}}}}")
+            match = re.search(rf"(?<![<>!=])(<=|>=|<>|!=|<|>|=)\s*'?{escaped}", self.sql_template)
+            if match:
+                operators[placeholder] = match.group(1)
+                continue
+            match = re.search(rf"{escaped}'?\s*(<=|>=|<>|!=|<|>|=)", self.sql_template)
+            if match:
+                operators[placeholder] = FLIPPED_OPERATORS[match.group(1)]
+        return operators
+
+    def monotone_dimensions(self):
+        """
+        (range pairs, single placeholders) that are searched by bisection: _start/_end pairs of a numeric
+        column, and numeric placeholders compared with <, <=, > or >= in the template
+        """
+        placeholders = self.sorted_placeholders()
+        operators = self.placeholder_operators()
+        range_pairs = []
+        singles = []
+        for placeholder in placeholders:
+            if placeholder.endswith('_start'):
+                end_placeholder = f"{placeholder[:-6]}_end"
+                if end_placeholder in placeholders:
+                    range_pairs.append((placeholder, end_placeholder))
+            elif not placeholder.endswith('_end') and operators.get(placeholder) in ("<", "<=", ">", ">="):
+                singles.append(placeholder)
+        return range_pairs, singles
+
+    def card_predicates(self, values):
+        """
+        The predicates of a resolved config for CardinalityEstimator.log_rows: one "between" per
+        _start/_end pair and one comparison per other placeholder with a recognized operator
+        """
+        predicates = []
+        for placeholder, value in values.items():
+            table_name, column_name = placeholder.split('.')
+            if placeholder.endswith('_start') and f"{placeholder[:-6]}_end" in values:
+                predicates.append((table_name, column_name[:-6], "between", (value, values[f"{placeholder[:-6]}_end"])))
+            elif placeholder.endswith('_end') and f"{placeholder[:-4]}_start" in values:
+                continue
+            elif placeholder in self.screen_operators:
+                predicates.append((table_name, column_name, self.screen_operators[placeholder], value))
+        return predicates
+
+    def bisect_to_target(self, evaluate, size, budget):
+        """
+        Bisection over positions 0..size-1 for a position whose cost lies in target_cost, assuming the
+        cost is monotone (increasing or decreasing) in the position. Returns (position or None, probes used).
+        """
+        c_l, c_r = self.target_cost
+        if size < 2 or budget < 2:
+            return None, 0
+        low_cost, high_cost = evaluate(0), evaluate(size - 1)
+        used = 2
+        if low_cost is None or high_cost is None:
+            return None, used
+        if c_l <= low_cost <= c_r:
+            return 0, used
+        if c_l <= high_cost <= c_r:
+            return size - 1, used
+        if c_r < min(low_cost, high_cost) or c_l > max(low_cost, high_cost):
+            # the target interval is not reachable along this dimension
+            return None, used
+
+        increasing = high_cost >= low_cost
+        lo, hi = 0, size - 1
+        while hi - lo > 1 and used < budget:
+            mid = (lo + hi) // 2
+            cost = evaluate(mid)
+            used += 1
+            if cost is None:
+                return None, used
+            if c_l <= cost <= c_r:
+                return mid, used
+            if (cost < c_l) == increasing:
+                lo = mid
+            else:
+                hi = mid
+        return None, used
+
+    def monotone_search(self, trials_number):
+        """
+        Structured search that runs before the optimizer for range-shaped targets. Every other placeholder
+        stays at the middle of its sequence while one range width (window centred in the domain) or one
+        single value is bisected into target_cost in O(log n) probes; a hit is then widened to more
+        queries in the interval by sliding the window, or stepping the value, around it.
+        Uses at most half of trials_number probes and stops after trials_number // 5 hits.
+        Returns the number of probes made.
+        """
+        range_pairs, singles = self.monotone_dimensions()
+        if not range_pairs and not singles:
+            return 0
+
+        c_l, c_r = self.target_cost
+        sequences = {name: self.value_domains[name].labels for name in self.search_space.get_hyperparameter_names()}
+        base_config = {name: sequence[len(sequence) // 2] for name, sequence in sequences.items()}
+        budget = trials_number // 2
+        wanted_hits = max(1, trials_number // 5)
+        probed = {}
+        state = {"probes": 0, "hits": 0}
+
+        def probe(config):
+            key = tuple(sorted(config.items()))
+            if key not in probed:
+                num_costs = len(self.costs)
+                # bisection needs real costs, so its probes bypass the card screen
+                self.set_and_replay(config, screen=False)
+                state["probes"] += 1
+                probed[key] = self.costs[-1] if len(self.costs) > num_costs else None
+                if probed[key] is not None and c_l <= probed[key] <= c_r:
+                    state["hits"] += 1
+            return probed[key]
+
+        def done():
+            return state["probes"] >= budget or state["hits"] >= wanted_hits
+
+        for start_name, end_name in range_pairs:
+            if done():
+                break
+            sequence = sequences[start_name]
+            size = len(sequence)
+
+            def window(width, offset=None):
+                if offset is None:
+                    offset = (size - 1 - width) // 2
+                return dict(base_config, **{start_name: sequence[offset], end_name: sequence[offset + width]})
+
+            width, _ = self.bisect_to_target(lambda width: probe(window(width)), size, budget - state["probes"])
+            if width is None:
+                continue
+            # windows of the same width at other offsets select a similar number of rows
+            for offset in np.linspace(0, size - 1 - width, num=min(size - width, budget), dtype=int):
+                if done():
+                    break
+                probe(window(width, int(offset)))
+
+        for name in singles:
+            if done():
+                break
+            sequence = sequences[name]
+            position, _ = self.bisect_to_target(lambda position: probe(dict(base_config, **{name: sequence[position]})), len(sequence), budget - state["probes"])
+            if position is None:
+                continue
+            # neighbouring values keep the cost in the interval until it leaves on both sides
+            for step in range(1, len(sequence)):
+                inside = False
+                for neighbour in (position - step, position + step):
+                    if 0 <= neighbour < len(sequence) and not done():
+                        cost = probe(dict(base_config, **{name: sequence[neighbour]}))
+                        inside = inside or (cost is not None and c_l <= cost <= c_r)
+                if not inside or done():
+                    break
+
+        return state["probes"]
 
     def store_costs(self, folder_path, prefix_name=None):
         if not os.path.exists(folder_path):
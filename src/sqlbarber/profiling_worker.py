@@ -0,0 +1,50 @@
+"""
+Process-pool entry point used by SQLBarberRunner.initial_profiling_parallel
+"""
+
+import traceback
+from .predicate_enumerator import PredicateEnumerator
+from .metric_store import MetricStore
+from .cost_cache import CostCache
+
+# one DB connection per worker process, reused by every template the worker profiles
+_db_controllers = {}
+
+
+def _get_db_controller(controller_class, controller_params):
+    key = (controller_class, tuple(sorted(controller_params.items())))
+    if key not in _db_controllers:
+        _db_controllers[key] = controller_class(**controller_params)
+    return _db_controllers[key]
+
+
+def profile_template(controller_class, controller_params, enumerator_params, num_profiling, metric_store_path=None, cost_cache_path=None):
+    """
+    Run analyze_template for one template in a worker process.
+    Only picklable values go in and out: the worker builds its own DB controller, metric store and cost cache.
+    """
+    template_id = enumerator_params.get("template_id")
+    try:
+        db_controller = _get_db_controller(controller_class, controller_params)
+        predicate_enumerator = PredicateEnumerator(
+            db_controller=db_controller,
+            metric_store=MetricStore(metric_store_path) if metric_store_path is not None else None,
+            cost_cache=CostCache.shared(cost_cache_path) if cost_cache_path is not None else None,
+            **enumerator_params
+        )
+        costs = predicate_enumerator.analyze_template(num_profiling)
+        return {
+            "template_id": template_id,
+            "costs": costs,
+            "queries": predicate_enumerator.queries,
+            "query_costs": predicate_enumerator.costs,
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "template_id": template_id,
+            "costs": None,
+            "queries": [],
+            "query_costs": [],
+            "error": f"{e}\n{traceback.format_exc()}",
+        }
@@ -0,0 +1,83 @@
+"""
+Deduplicated, columnar store of the queries generated during a SQLBarber run
+"""
+
+import re
+import numpy as np
+
+
+class ResultStore:
+    """
+    Query texts are kept in insertion order with a hash index for O(1) deduplication;
+    cost, template id and interval index live in growing NumPy columns next to them.
+    Missing values are NaN (cost) or -1 (template id, interval).
+    """
+
+    TEMPLATE_ID_PATTERN = re.compile(r'-- Template ID: (\d+)')
+
+    def __init__(self, interval_index, initial_capacity=1024):
+        self.interval_index = interval_index
+        self.queries = []
+        self._rows = {}
+        self._size = 0
+        self._cost = np.full(initial_capacity, np.nan, dtype=np.float64)
+        self._template_id = np.full(initial_capacity, -1, dtype=np.int32)
+        self._interval = np.full(initial_capacity, -1, dtype=np.int32)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, query):
+        return query in self._rows
+
+    @property
+    def costs(self):
+        return self._cost[:self._size]
+
+    @property
+    def template_ids(self):
+        return self._template_id[:self._size]
+
+    @property
+    def intervals(self):
+        return self._interval[:self._size]
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * len(self._cost))
+        for name, fill_value in (("_cost", np.nan), ("_template_id", -1), ("_interval", -1)):
+            old_column = getattr(self, name)
+            new_column = np.full(capacity, fill_value, dtype=old_column.dtype)
+            new_column[:self._size] = old_column[:self._size]
+            setattr(self, name, new_column)
+
+    def add(self, query, cost):
+        """ Add a query unless it is already stored, return True if it was added """
+        return self.add_many([query], [cost]) == 1
+
+    def add_many(self, queries, costs):
+        """ Add the queries that are not stored yet, return how many were added """
+        new_queries = []
+        new_costs = []
+        for query, cost in zip(queries, costs):
+            if query in self._rows:
+                continue
+            self._rows[query] = self._size + len(new_queries)
+            new_queries.append(query)
+            new_costs.append(cost)
+        if not new_queries:
+            return 0
+
+        start, end = self._size, self._size + len(new_queries)
+        if end > len(self._cost):
+            self._grow(end)
+        self.queries.extend(new_queries)
+        self._cost[start:end] = [np.nan if cost is None else cost for cost in new_costs]
+        self._template_id[start:end] = [self._parse_template_id(query) for query in new_queries]
+        self._interval[start:end] = self.interval_index.assign(new_costs)
+        self._size = end
+        return len(new_queries)
+
+    @classmethod
+    def _parse_template_id(cls, query):
+        match = cls.TEMPLATE_ID_PATTERN.search(query)
+        return int(match.group(1)) if match else -1
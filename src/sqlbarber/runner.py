@@ -2,21 +2,31 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 from .predicate_enumerator import PredicateEnumerator
+from .metric_store import MetricStore
+from .cost_cache import CostCache
+from .profiling_worker import profile_template
+from .interval_index import IntervalIndex
+from .result_store import ResultStore
+from .card_estimator import CardinalityEstimator
+from .workload_exporter import WorkloadExporter
 from .template_generator import NaiveSQLTemplateGenerator, AdvancedSQLTemplateGenerator
 from .utils import timing_decorator
 import json
+import pickle
 from datetime import datetime
 import sqlparse, re
 import time
 import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import multiprocessing
+import threading
 from scipy.stats import wasserstein_distance
 import traceback
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 class SQLBarberRunner:
-    def __init__(self, task_name, gpt, template_generator, db_controller, semantic_requirements, total_sqls, min_cost, max_cost, num_intervals=10, target="cost", cost_type="sum_cost", summary_name=None):
+    def __init__(self, task_name, gpt, template_generator, db_controller, semantic_requirements, total_sqls, min_cost, max_cost, num_intervals=10, target="cost", cost_type="sum_cost", summary_name=None, resume=False, use_prepared_statements=False, use_cost_cache=True, profiling_workers=1, optimization_workers=1, optimizer="smac", structured_search=False, use_card_estimator=False, probe_batch_size=1):
         self.ori_task_name = task_name
         self.task_name = task_name + "_" + datetime.now().strftime("%Y-%m-%d_%H-%M")
         self.gpt = gpt
@@ -26,6 +36,8 @@ class SQLBarberRunner:
         self.min_cost = min_cost
         self.max_cost = max_cost
         self.num_intervals = num_intervals
+        # single place that decides which cost interval a cost belongs to
+        self.interval_index = IntervalIndex(min_cost, max_cost, num_intervals)
         self.target_distribution = None
         self.current_distribution = [0 for _ in range(num_intervals)]
         self.template_ids = None
@@ -37,9 +49,41 @@ class SQLBarberRunner:
         elif self.target == "cost" or self.target == "time" or self.target == "cpu":
             self.cost_type = "output_cost"
         self.summary_name = summary_name
+        # probe templates through server-side prepared statements instead of literal query text
+        self.use_prepared_statements = use_prepared_statements
+        # backend that searches predicate values: "smac" or the in-process "surrogate" (see optimizers.py)
+        self.optimizer = optimizer
+        # bisect monotone range and comparison predicates into an interval before running the optimizer
+        self.structured_search = structured_search
+        # number of configs each enumerator asks its optimizer for and EXPLAINs in one round trip
+        self.probe_batch_size = probe_batch_size
+        # local estimates from pg_stats (fetched once) that decide which card-target probes reach EXPLAIN
+        self.card_estimator = None
+        if use_card_estimator and self.target == "card":
+            column_statistics = self.db_controller.get_column_statistics()
+            if column_statistics is not None:
+                self.card_estimator = CardinalityEstimator(column_statistics)
+        # number of processes that profile templates concurrently in initial_profiling
+        self.profiling_workers = profiling_workers
+        # number of (interval, template) optimizations that run concurrently in each iteration
+        self.optimization_workers = optimization_workers
+        if optimization_workers > 1 and not self.db_controller.ensure_pool_size(optimization_workers):
+            # the workers would all share (and serialize on) one connection, and one worker's error would abort the others' queries
+            raise ValueError(f"optimization_workers={optimization_workers} needs one connection per worker, which the {self.db_controller.name} controller cannot pool.")
+        # guards current_distribution, profiling_result, queries/costs and the bookkeeping sets between those workers
+        self.state_lock = threading.RLock()
 
         self.template_generator = self.init_template_generator(template_generator, task_name)
 
+        self._root = Path(__file__).resolve().parents[2]
+        # runner state saved after every completed phase and iteration of generate_sql
+        self.checkpoint_file = f"{self._root}/outputs/intermediate/checkpoints/{self.ori_task_name}/{self.summary_name}/checkpoint.pkl"
+        os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+        self.resume_checkpoint = self.load_checkpoint() if resume else None
+        if self.resume_checkpoint is not None:
+            # keep writing to the logs, SMAC histories and workload files of the interrupted run
+            self.task_name = self.resume_checkpoint["task_name"]
+
         # Track bad combinations of (interval, template_id)
         self.bad_combinations = set()
 
@@ -49,23 +93,32 @@ class SQLBarberRunner:
         # Track how many times an interval is selected for optimization
         self.selected_times_of_intervals = [0 for _ in range(num_intervals)]
 
-        self._root = Path(__file__).resolve().parents[2]
         self.column_info_path = f"{self._root}/outputs/intermediate/db_meta_info/{self.ori_task_name}/column_info.json"
         self.seed_template_path = f"{self._root}/outputs/final/sql_template/{self.ori_task_name}"
+        # metrics of every probe, shared by runs with different targets on the same database
+        self.metric_store = MetricStore(f"{self._root}/outputs/intermediate/metric_history/{self.ori_task_name}")
+        # estimates of every probed query, reused across iterations and runs until the DBMS statistics change
+        self.cost_cache = None
+        if use_cost_cache:
+            cost_cache_path = f"{self._root}/outputs/intermediate/cost_cache/{self.ori_task_name}.sqlite"
+            os.makedirs(os.path.dirname(cost_cache_path), exist_ok=True)
+            self.cost_cache = CostCache.shared(cost_cache_path)
         os.makedirs(os.path.dirname(self.seed_template_path), exist_ok=True)
 
         # Log file setup
         self.log_file = os.path.join(f"{self._root}/outputs/intermediate/logs/{self.task_name}", f"process.log")
         os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
 
-        self.queries = []
-        self.costs = []
+        # every distinct generated query with its cost, template id and interval
+        self.results = ResultStore(self.interval_index)
 
         # Performance summary file setup
         self.workload_file = os.path.join(f"{self._root}/outputs/final/{self.task_name}/{self.summary_name}", "workload.json")
         self.summary_file = os.path.join(f"{self._root}/outputs/final/{self.task_name}/{self.summary_name}", "summary.json")
         os.makedirs(os.path.dirname(self.workload_file), exist_ok=True)
         os.makedirs(os.path.dirname(self.summary_file), exist_ok=True)
+        # accepted queries are streamed to workload.jsonl as they are produced, so a crashed run keeps them
+        self.exporter = WorkloadExporter(os.path.dirname(self.workload_file), self.target)
 
     def init_template_generator(self, template_generator, task_name):
         if template_generator == "Naive":
@@ -286,6 +339,10 @@ class SQLBarberRunner:
             template_ids = self.template_ids    
             templates = self.templates
 
+        if self.profiling_workers > 1 and self.target != "time":
+            # execution times measured concurrently would disturb each other, so "time" stays sequential
+            return self.initial_profiling_parallel(num_profiling, template_ids, templates)
+
         profiling_result = {}
         for id in range(len(template_ids)):
             template_id = template_ids[id]
@@ -294,6 +351,11 @@ class SQLBarberRunner:
             self.log(f"Start initial profiling of {template_id}")
             file_path = f"./SQLBarber/cost_history/{self.target}/{self.task_name}/initial_sampling_{template_id}.json"
             costs = self.read_cost(file_path)
+            if costs is None:
+                stored = self.reuse_stored_metrics(template_id, template, num_profiling)
+                if stored is not None:
+                    stored_queries, costs = stored
+                    self.add_candidate_queries(stored_queries, costs)
             if costs is None:
                 try:
                     predicate_enumerator = PredicateEnumerator(
@@ -304,18 +366,20 @@ class SQLBarberRunner:
                         target_cost=10, 
                         file_path=self.column_info_path, 
                         target=self.target,
-                        cost_type=self.cost_type
+                        cost_type=self.cost_type,
+                        use_prepared=self.use_prepared_statements,
+                        metric_store=self.metric_store,
+                        cost_cache=self.cost_cache,
+                        optimizer=self.optimizer,
+                        structured_search=self.structured_search,
+                        card_estimator=self.card_estimator,
+                        batch_size=self.probe_batch_size
                     )
 
                     costs = predicate_enumerator.analyze_template(num_profiling)
                     profiling_result[template_id] = costs
 
-                    candidate_queries = predicate_enumerator.queries
-                    candidate_costs = predicate_enumerator.costs
-                    for query, cost in zip(candidate_queries, candidate_costs):
-                        if query not in self.queries:
-                            self.queries.append(query)
-                            self.costs.append(cost)
+                    self.add_candidate_queries(predicate_enumerator.queries, predicate_enumerator.costs)
 
                 except Exception as e:
                     self.log(f"Failed to process {template_id} due to Error: {e}")
@@ -327,6 +391,109 @@ class SQLBarberRunner:
 
         return profiling_result
 
+    def initial_profiling_parallel(self, num_profiling, template_ids, templates):
+        """
+        initial_profiling with templates profiled concurrently on a process pool, each worker with its
+        own DB connection and SMAC output directory. Results are merged in template order, so the
+        outcome does not depend on which worker finishes first.
+        """
+        profiling_result = {}
+        stored_results = {}
+        jobs = OrderedDict()
+        for template_id, template in zip(template_ids, templates):
+            self.log(f"Start initial profiling of {template_id}")
+            file_path = f"./SQLBarber/cost_history/{self.target}/{self.task_name}/initial_sampling_{template_id}.json"
+            costs = self.read_cost(file_path)
+            if costs is not None:
+                stored_results[template_id] = ([], costs)
+                continue
+            stored = self.reuse_stored_metrics(template_id, template, num_profiling)
+            if stored is not None:
+                stored_results[template_id] = stored
+            else:
+                jobs[template_id] = template
+
+        enumerator_params = {
+            "task_name": self.task_name,
+            "target_cost": 10,
+            "file_path": self.column_info_path,
+            "target": self.target,
+            "cost_type": self.cost_type,
+            "use_prepared": self.use_prepared_statements,
+            "optimizer": self.optimizer,
+            "structured_search": self.structured_search,
+            "batch_size": self.probe_batch_size,
+            # pickled into every worker: the estimator only holds the pg_stats statistics fetched once
+            "card_estimator": self.card_estimator,
+        }
+        metric_store_path = self.metric_store.folder_path
+        cost_cache_path = self.cost_cache.db_path if self.cost_cache is not None else None
+        controller_class = type(self.db_controller)
+        controller_params = self.db_controller.connection_params()
+
+        futures = {}
+        # spawn: a forked child would share (and on exit close) the sockets of the parent's DB connections
+        with ProcessPoolExecutor(max_workers=self.profiling_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for template_id, template in jobs.items():
+                futures[template_id] = executor.submit(
+                    profile_template, controller_class, controller_params,
+                    dict(enumerator_params, template_id=template_id, sql_template=template),
+                    num_profiling, metric_store_path, cost_cache_path
+                )
+
+            for template_id in template_ids:
+                if template_id in stored_results:
+                    stored_queries, costs = stored_results[template_id]
+                    self.add_candidate_queries(stored_queries, costs)
+                    profiling_result[template_id] = costs
+                else:
+                    try:
+                        result = futures[template_id].result()
+                    except Exception as e:
+                        self.log(f"Failed to process {template_id} due to Error: {e}")
+                        self.log(traceback.format_exc())
+                        continue
+                    if result["error"] is not None:
+                        self.log(f"Failed to process {template_id} due to Error: {result['error']}")
+                        continue
+                    profiling_result[template_id] = result["costs"]
+                    self.add_candidate_queries(result["queries"], result["query_costs"])
+                self.log(f"Finish initial profiling of {template_id}")
+
+        return profiling_result
+
+    def add_candidate_queries(self, queries, costs):
+        """ Add generated queries and their costs, skipping queries that are already known """
+        with self.state_lock:
+            start = len(self.results)
+            self.results.add_many(queries, costs)
+            new_rows = slice(start, len(self.results))
+            self.exporter.append(
+                self.results.queries[new_rows],
+                self.results.costs[new_rows],
+                self.results.template_ids[new_rows],
+                self.results.intervals[new_rows]
+            )
+
+    def reuse_stored_metrics(self, template_id, template, num_profiling):
+        """
+        Profiling result of a template from the profiling probes recorded by an earlier run with
+        another target. Returns (queries, costs) of num_profiling of them, or None if too few are stored.
+        """
+        if self.target == "time":
+            return None
+
+        records = MetricStore.profiling_records(self.metric_store.load(template), exclude_target=self.target, limit=num_profiling)
+        if len(records) < num_profiling:
+            return None
+
+        costs = MetricStore.target_costs(records, self.target, self.cost_type)
+        if all(cost is None for cost in costs):
+            return None
+
+        self.log(f"Reuse {len(records)} stored probes of {template_id} for target {self.target}")
+        return list(records), costs
+
     def update_distribution_profiling(self, profiling_result):
         """
         Update target distribution based on profiling results
@@ -348,15 +515,9 @@ class SQLBarberRunner:
         self.log(f"Target distribution: {self.target_distribution}")
         self.log(f"Distribution before update: {self.current_distribution}")
 
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        
         # Update current distribution based on costs
-        for cost in costs:
-            if cost is not None:
-                for i in range(self.num_intervals):
-                    if intervals[i] <= cost < intervals[i + 1]:
-                        self.current_distribution[i] += 1
-                        break
+        for i, new_count in enumerate(self.interval_index.counts(costs)):
+            self.current_distribution[i] += int(new_count)
 
         self.log(f"Distribution after update: {self.current_distribution}")
         self.log("--------------------------------------------------")
@@ -374,17 +535,13 @@ class SQLBarberRunner:
             str: The ID of the best template to use for this interval.
             dict: A dictionary containing the probabilities of all templates for the target interval.
         """
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        interval_start = intervals[interval_index]
-        interval_end = intervals[interval_index + 1]
-
         best_template_id = None
         highest_probability = 0
         template_probabilities = {}
         
         for template_id, costs in profiling_result.items():
             # Calculate the number of costs that fall in the target interval
-            count_in_interval = sum(1 for c in costs if interval_start <= c < interval_end)
+            count_in_interval = int(np.count_nonzero(self.interval_index.assign(costs) == interval_index))
             total_count = len(costs)
             
             # Calculate the probability of this template producing SQLs in the target interval
@@ -404,9 +561,7 @@ class SQLBarberRunner:
 
             Returns a list of (template_id, probability), sorted by probability descending.
         """
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        interval_start = intervals[interval_index]
-        interval_end = intervals[interval_index + 1]
+        interval_start, interval_end = self.interval_index.bounds(interval_index)
 
         # Calculate probability per template
         template_probabilities = []
@@ -428,7 +583,7 @@ class SQLBarberRunner:
         template_probabilities.sort(key=lambda x: x[1], reverse=True)
         return template_probabilities
     
-    def has_limited_cost_diversity(self, template_id, profiling_result, target_interval, unique_cost_threshold=3):
+    def has_limited_cost_diversity(self, template_id, profiling_result, interval_index, unique_cost_threshold=3):
         """
         Check if a template only generates very few unique costs (less than threshold)
         and these costs do not fall within the target interval.
@@ -436,7 +591,7 @@ class SQLBarberRunner:
         Args:
             template_id: The ID of the template to check
             profiling_result: Dictionary mapping template_ids to their observed costs
-            target_interval: [lower_bound, upper_bound] of the target cost interval
+            interval_index: Index of the target cost interval
             unique_cost_threshold: Maximum number of unique costs to consider "limited diversity"
             
         Returns:
@@ -456,13 +611,12 @@ class SQLBarberRunner:
         
         # Check if we have very few unique costs
         if len(unique_costs) <= unique_cost_threshold:
-            # Check if any of these costs fall within our target interval
-            lower_bound, upper_bound = target_interval
-            costs_in_range = [c for c in unique_costs if lower_bound <= c < upper_bound]
+            # Check if any of these costs fall within our target interval, by the same edge rule as every other assignment
+            costs_in_range = self.interval_index.assign(list(unique_costs)) == interval_index
             
             # If we have few unique costs AND none in the target range, return True
-            if not costs_in_range:
-                self.log(f"Template {template_id} has only {len(unique_costs)} unique costs and none in target range {target_interval}")
+            if not costs_in_range.any():
+                self.log(f"Template {template_id} has only {len(unique_costs)} unique costs and none in target range {self.get_interval_bounds(interval_index)}")
                 return True
         
         # Either we have enough diversity or at least some costs in the range
@@ -485,10 +639,8 @@ class SQLBarberRunner:
                 return 0
 
             # Step 2: Get the bounds of the target interval
-            intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-            interval_lower_bound = intervals[interval_index]
-            interval_upper_bound = intervals[interval_index + 1]
-            target_interval = [interval_lower_bound, interval_upper_bound]
+            target_interval = self.interval_index.bounds(interval_index)
+            interval_lower_bound, interval_upper_bound = target_interval
 
             old_diff_in_interval = self.target_distribution[interval_index] - self.current_distribution[interval_index]
 
@@ -538,7 +690,14 @@ class SQLBarberRunner:
                 target_cost=target_interval,
                 file_path=self.column_info_path,
                 target=self.target,
-                cost_type=self.cost_type
+                cost_type=self.cost_type,
+                use_prepared=self.use_prepared_statements,
+                metric_store=self.metric_store,
+                cost_cache=self.cost_cache,
+                optimizer=self.optimizer,
+                structured_search=self.structured_search,
+                card_estimator=self.card_estimator,
+                batch_size=self.probe_batch_size
             )
 
             # Use analyze_template (which is what initial_profiling calls internally)
@@ -552,12 +711,7 @@ class SQLBarberRunner:
                 new_costs = costs
 
                 # Collect queries and costs for tracking
-                candidate_queries = predicate_enumerator.queries
-                candidate_costs = predicate_enumerator.costs
-                for query, cost in zip(candidate_queries, candidate_costs):
-                    if query not in self.queries:
-                        self.queries.append(query)
-                        self.costs.append(cost)
+                self.add_candidate_queries(predicate_enumerator.queries, predicate_enumerator.costs)
 
             except Exception as e:
                 self.log(f"Failed to profile template {selected_template_id} due to Error: {e}")
@@ -613,73 +767,11 @@ class SQLBarberRunner:
                 return 0
 
             # Step 2: Get the bounds of the target interval
-            intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-            interval_lower_bound = intervals[interval_index]
-            interval_upper_bound = intervals[interval_index + 1]
-            target_interval = [interval_lower_bound, interval_upper_bound]
-
+            target_interval = self.get_interval_bounds(interval_index)
             old_diff_in_interval = self.target_distribution[interval_index] - self.current_distribution[interval_index]
 
-            # Step 3: Find the top-k template for the target interval
-            # best_template_id, template_probabilities = self.find_best_template_for_interval(interval_index, profiling_result)
-            top_k_templates = self.find_templates_for_interval(interval_index, profiling_result)
-
-            # Template filter based on bad_combinations and remaining space size
-            filtered_templates = []
-            for (template_id, prob) in top_k_templates:
-                # Check if this template is in bad_combinations
-                if (interval_index, template_id) in self.bad_combinations:
-                    continue
-
-                # Check the "remaining_space_size" constraint:
-                # If we do not yet have a recorded space size, assume it's infinite
-                current_space = self.template_remaining_spaces.get(template_id, float('inf'))
-                if current_space < 5 * num_difference:
-                    continue
-
-                # Check if template has limited cost diversity outside target range
-                if self.has_limited_cost_diversity(template_id, profiling_result, target_interval):
-                    self.log(f"Skipping template {template_id} due to limited cost diversity outside the target range")
-                    continue
-                    
-                filtered_templates.append((template_id, prob))
-
-            # Use only the top-10 templates with max probability from the filtered list
-            # if len(filtered_templates) >= 10:
-            #     filtered_templates = filtered_templates[:10]
-            
-            # Use probability based sampling
-            if len(filtered_templates) > 10:
-                # Extract populations and weights
-                population = [tpl[0] for tpl in filtered_templates]
-                weights    = [tpl[1] for tpl in filtered_templates]
-   
-                # Sample 10 items in proportion to their probability
-                if sum(weights) == 0:
-                    # Fall back to uniform random sampling
-                    sampled_template_ids = random.sample(population, k=min(10, len(population)))
-                else:
-                    # Sample 10 items in proportion to their probability
-                    sampled_template_ids = random.choices(
-                        population=population,
-                        weights=weights,
-                        k=10
-                    )
-
-                # If you need (template_id, probability) pairs from what you sampled:
-                # You can rebuild them by matching IDs back to their probabilities.
-                # For example:
-                sampled_templates = []
-                for template_id in sampled_template_ids:
-                    # Find probability in filtered_templates again
-                    # (in practice, store them in a dictionary for quick lookup)
-                    for tpl_id, tpl_prob in filtered_templates:
-                        if tpl_id == template_id:
-                            sampled_templates.append((tpl_id, tpl_prob))
-                            break
-                filtered_templates = sampled_templates
-
-            # Step 4: If no suitable template is found, log and try the next interval
+            # Step 3-4: Find the top-k templates for the target interval
+            filtered_templates = self.select_templates_for_interval(interval_index, num_difference, target_interval, profiling_result)
             if not filtered_templates:
                 self.log(f"No suitable template found for interval {interval_index}. Trying the next interval.")
                 self.missing_intervals.append(interval_index)
@@ -690,84 +782,230 @@ class SQLBarberRunner:
             for template_id, prob in filtered_templates:
                 if (interval_index, template_id) in self.bad_combinations:
                     continue
+                if self.optimize_interval_with_template(
+                    interval_index, template_id, prob, target_interval, num_difference,
+                    old_diff_in_interval, profiling_result, reuse_history
+                ):
+                    improvement_found = True
 
-                # Copy the distribution before we add these new queries (for counting "useful" queries)
-                distribution_before_update = self.current_distribution[:]
-
-                self.log(f"Attempting to optimize interval {interval_index} using template {template_id} (prob={prob:.4f}).")
-                template = self.templates[self.template_ids.index(template_id)]
-
-                # Instantiate PredicateEnumerator with the interval as the target_cost
-                predicate_enumerator = PredicateEnumerator(
-                    self.task_name, 
-                    self.db_controller, 
-                    template_id, 
-                    template, 
-                    target_cost=target_interval,  # Pass the interval here
-                    file_path=self.column_info_path,
-                    target=self.target,
-                    cost_type=self.cost_type
-                )
+            self.record_interval_outcome(interval_index, improvement_found)
 
-                # Optimize for the interval
-                new_costs, remaining_space_size = predicate_enumerator.optimize(
-                    f"{self.task_name}_{template_id}_{self.target}_{interval_lower_bound}_to_{interval_upper_bound}",
-                    trials_number=int(5 * num_difference), 
-                    initial_config_number=int(0.5 * num_difference), 
-                    reuse_history=reuse_history
-                )
-                self.template_remaining_spaces[template_id] = remaining_space_size
-                costs = []
-                for cost in new_costs:
-                    costs.append(self.calculate_cost(cost))
-                new_costs = costs
+            # Successfully optimized one interval, exit the loop, return the largest number of difference in an interval
+            return num_difference
 
-                candidate_queries = predicate_enumerator.queries
-                candidate_costs = predicate_enumerator.costs
-                for query, cost in zip(candidate_queries, candidate_costs):
-                    if query not in self.queries:
-                        self.queries.append(query)
-                        self.costs.append(cost)
-
-                # Step 6: Update current_distribution
-                if new_costs != []:
-                    self.log("Update current distribution successfully")
-                    self.update_distribution(new_costs)
-                    # update the profiling_result on the fly
-                    profiling_result[template_id] = profiling_result.get(template_id, []) + new_costs
-                else:
-                    self.log("Optimization result in Func optimize_for_interval is None")
+    def optimize_for_intervals_parallel(self, profiling_result, reuse_history=True):
+        """
+            Concurrent version of optimize_for_interval:
+            - Takes up to optimization_workers of the most under-filled intervals at once.
+            - Runs all their (interval, template) optimizations on a thread pool, so that several
+                Bayesian optimizations keep the DB backends busy at the same time.
+            - current_distribution, profiling_result and the bookkeeping sets are shared
+                between the workers and only updated under self.state_lock.
+        """
+        while True:
+            differences = [self.target_distribution[i] - self.current_distribution[i] for i in range(self.num_intervals)]
+            candidate_intervals = [
+                i for i in np.argsort(differences, kind="stable")[::-1]
+                if i not in self.missing_intervals and differences[i] > 0
+            ][:self.optimization_workers]
+            if not candidate_intervals:
+                self.log("No more intervals with suitable templates to optimize.")
+                return 0
 
-                new_diff_in_interval = (
-                    self.target_distribution[interval_index] - self.current_distribution[interval_index]
-                )
-                if new_diff_in_interval < old_diff_in_interval:
-                    self.log(f"Improvement found for template {template_id} in interval {interval_index}.")
-                    improvement_found = True
+            jobs = []
+            selected_intervals = {}
+            for interval_index in candidate_intervals:
+                interval_index = int(interval_index)
+                num_difference = differences[interval_index]
+                target_interval = self.get_interval_bounds(interval_index)
+                filtered_templates = self.select_templates_for_interval(interval_index, num_difference, target_interval, profiling_result)
+                if not filtered_templates:
+                    self.log(f"No suitable template found for interval {interval_index}. Trying the next interval.")
+                    self.missing_intervals.append(interval_index)
+                    continue
 
-                # Step 7: add bad combination
-                total_new = len(new_costs)
-                useful_count = self._count_useful_queries(distribution_before_update, new_costs)
-                ratio_useful = useful_count / total_new if total_new else 0.0
+                selected_intervals[interval_index] = num_difference
+                for template_id, prob in dict.fromkeys(filtered_templates):
+                    jobs.append((interval_index, template_id, prob, target_interval, num_difference, num_difference))
 
-                # If fewer than 5% of new queries helped fill *any* underfilled intervals => mark as bad
-                if ratio_useful < 0.05:
-                    self.log(
-                        f"No improvement and only {ratio_useful:.2%} of new queries were useful; "
-                        "marking as bad combination."
-                    )
-                    self.bad_combinations.add((interval_index, template_id))
+            if not jobs:
+                continue  # every candidate interval is missing now, look at the next ones
 
-            if not improvement_found:
-                # Could not improve with any of the top-10 templates
-                self.selected_times_of_intervals[interval_index] += 1
-                self.log(f"No improvement found for interval {interval_index} using top-5 templates. Times: {self.selected_times_of_intervals[interval_index]}.")
-                if self.selected_times_of_intervals[interval_index] >= 5:
-                    self.log(f"No improvement found for interval {interval_index} for {self.selected_times_of_intervals[interval_index]} times. Mark this interval as missing.")
-                    self.missing_intervals.append(interval_index)
+            self.log(f"Optimizing intervals {list(selected_intervals)} with {len(jobs)} (interval, template) pairs in parallel.")
+            improvements = {interval_index: False for interval_index in selected_intervals}
+            with ThreadPoolExecutor(max_workers=self.optimization_workers) as executor:
+                futures = {
+                    executor.submit(self.optimize_interval_with_template, *job, profiling_result, reuse_history): job
+                    for job in jobs
+                }
+                for future in as_completed(futures):
+                    interval_index, template_id = futures[future][:2]
+                    try:
+                        if future.result():
+                            improvements[interval_index] = True
+                    except Exception as e:
+                        self.log(f"Failed to optimize interval {interval_index} with template {template_id} due to Error: {e}")
+                        self.log(traceback.format_exc())
+
+            for interval_index, improvement_found in improvements.items():
+                self.record_interval_outcome(interval_index, improvement_found)
+
+            return max(selected_intervals.values())
+
+    def get_interval_bounds(self, interval_index):
+        """ [lower, upper] cost bounds of an interval """
+        return self.interval_index.bounds(interval_index)
+
+    def select_templates_for_interval(self, interval_index, num_difference, target_interval, profiling_result):
+        """ The (template_id, probability) pairs worth optimizing for an interval, at most 10 """
+        # best_template_id, template_probabilities = self.find_best_template_for_interval(interval_index, profiling_result)
+        top_k_templates = self.find_templates_for_interval(interval_index, profiling_result)
+
+        # Template filter based on bad_combinations and remaining space size
+        filtered_templates = []
+        for (template_id, prob) in top_k_templates:
+            # Check if this template is in bad_combinations
+            if (interval_index, template_id) in self.bad_combinations:
+                continue
+
+            # Check the "remaining_space_size" constraint:
+            # If we do not yet have a recorded space size, assume it's infinite
+            current_space = self.template_remaining_spaces.get(template_id, float('inf'))
+            if current_space < 5 * num_difference:
+                continue
+
+            # Check if template has limited cost diversity outside target range
+            if self.has_limited_cost_diversity(template_id, profiling_result, interval_index):
+                self.log(f"Skipping template {template_id} due to limited cost diversity outside the target range")
+                continue
                 
-            # Successfully optimized one interval, exit the loop, return the largest number of difference in an interval
-            return num_difference
+            filtered_templates.append((template_id, prob))
+
+        # Use only the top-10 templates with max probability from the filtered list
+        # if len(filtered_templates) >= 10:
+        #     filtered_templates = filtered_templates[:10]
+        
+        # Use probability based sampling
+        if len(filtered_templates) > 10:
+            # Extract populations and weights
+            population = [tpl[0] for tpl in filtered_templates]
+            weights    = [tpl[1] for tpl in filtered_templates]
+
+            # Sample 10 items in proportion to their probability
+            if sum(weights) == 0:
+                # Fall back to uniform random sampling
+                sampled_template_ids = random.sample(population, k=min(10, len(population)))
+            else:
+                # Sample 10 items in proportion to their probability
+                sampled_template_ids = random.choices(
+                    population=population,
+                    weights=weights,
+                    k=10
+                )
+
+            # If you need (template_id, probability) pairs from what you sampled:
+            # You can rebuild them by matching IDs back to their probabilities.
+            # For example:
+            sampled_templates = []
+            for template_id in sampled_template_ids:
+                # Find probability in filtered_templates again
+                # (in practice, store them in a dictionary for quick lookup)
+                for tpl_id, tpl_prob in filtered_templates:
+                    if tpl_id == template_id:
+                        sampled_templates.append((tpl_id, tpl_prob))
+                        break
+            filtered_templates = sampled_templates
+
+        return filtered_templates
+
+    def optimize_interval_with_template(self, interval_index, template_id, prob, target_interval, num_difference, old_diff_in_interval, profiling_result, reuse_history=True):
+        """
+        Run one Bayesian optimization of template_id towards target_interval and merge its queries.
+        Safe to call from several threads: shared state is only touched under self.state_lock.
+        Returns True if the interval got closer to its target.
+        """
+        interval_lower_bound, interval_upper_bound = target_interval
+        self.log(f"Attempting to optimize interval {interval_index} using template {template_id} (prob={prob:.4f}).")
+        template = self.templates[self.template_ids.index(template_id)]
+
+        # Instantiate PredicateEnumerator with the interval as the target_cost
+        predicate_enumerator = PredicateEnumerator(
+            self.task_name, 
+            self.db_controller, 
+            template_id, 
+            template, 
+            target_cost=target_interval,  # Pass the interval here
+            file_path=self.column_info_path,
+            target=self.target,
+            cost_type=self.cost_type,
+            use_prepared=self.use_prepared_statements,
+            metric_store=self.metric_store,
+            cost_cache=self.cost_cache,
+            optimizer=self.optimizer,
+            structured_search=self.structured_search,
+            card_estimator=self.card_estimator,
+            batch_size=self.probe_batch_size
+        )
+
+        # Optimize for the interval
+        new_costs, remaining_space_size = predicate_enumerator.optimize(
+            f"{self.task_name}_{template_id}_{self.target}_{interval_lower_bound}_to_{interval_upper_bound}",
+            trials_number=int(5 * num_difference), 
+            initial_config_number=int(0.5 * num_difference), 
+            reuse_history=reuse_history
+        )
+        costs = []
+        for cost in new_costs:
+            costs.append(self.calculate_cost(cost))
+        new_costs = costs
+
+        with self.state_lock:
+            self.template_remaining_spaces[template_id] = remaining_space_size
+            self.add_candidate_queries(predicate_enumerator.queries, predicate_enumerator.costs)
+
+            # Copy the distribution before we add these new queries (for counting "useful" queries)
+            distribution_before_update = self.current_distribution[:]
+
+            # Step 6: Update current_distribution
+            if new_costs != []:
+                self.log("Update current distribution successfully")
+                self.update_distribution(new_costs)
+                # update the profiling_result on the fly
+                profiling_result[template_id] = profiling_result.get(template_id, []) + new_costs
+            else:
+                self.log("Optimization result in Func optimize_for_interval is None")
+
+            new_diff_in_interval = (
+                self.target_distribution[interval_index] - self.current_distribution[interval_index]
+            )
+            improvement_found = new_diff_in_interval < old_diff_in_interval
+            if improvement_found:
+                self.log(f"Improvement found for template {template_id} in interval {interval_index}.")
+
+            # Step 7: add bad combination
+            total_new = len(new_costs)
+            useful_count = self._count_useful_queries(distribution_before_update, new_costs)
+            ratio_useful = useful_count / total_new if total_new else 0.0
+
+            # If fewer than 5% of new queries helped fill *any* underfilled intervals => mark as bad
+            if ratio_useful < 0.05:
+                self.log(
+                    f"No improvement and only {ratio_useful:.2%} of new queries were useful; "
+                    "marking as bad combination."
+                )
+                self.bad_combinations.add((interval_index, template_id))
+
+        return improvement_found
+
+    def record_interval_outcome(self, interval_index, improvement_found):
+        """ Count failed attempts of an interval and mark it as missing after 5 of them """
+        if not improvement_found:
+            # Could not improve with any of the top-10 templates
+            self.selected_times_of_intervals[interval_index] += 1
+            self.log(f"No improvement found for interval {interval_index} using top-5 templates. Times: {self.selected_times_of_intervals[interval_index]}.")
+            if self.selected_times_of_intervals[interval_index] >= 5:
+                self.log(f"No improvement found for interval {interval_index} for {self.selected_times_of_intervals[interval_index]} times. Mark this interval as missing.")
+                self.missing_intervals.append(interval_index)
         
     def _count_useful_queries(self, old_distribution, new_costs):
         """
@@ -778,20 +1016,10 @@ class SQLBarberRunner:
         - Once an interval matches or exceeds its target requirement, further queries in
         that interval are not considered "useful."
         """
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        dist_copy = old_distribution[:]
-        useful_count = 0
-
-        for cost in new_costs:
-            if cost is not None:
-                # Determine which interval this cost belongs to
-                for i in range(self.num_intervals):
-                    if intervals[i] <= cost < intervals[i + 1]:
-                        # If we still need queries in interval i, it's useful
-                        if dist_copy[i] < self.target_distribution[i]:
-                            useful_count += 1
-                            dist_copy[i] += 1  # Mark one more query allocated
-                        break
+        # per interval, only the queries up to the remaining need are useful
+        new_counts = self.interval_index.counts(new_costs)
+        remaining_need = np.maximum(np.array(self.target_distribution) - np.array(old_distribution), 0)
+        useful_count = int(np.minimum(new_counts, remaining_need).sum())
 
         return useful_count
 
@@ -909,9 +1137,7 @@ class SQLBarberRunner:
         self.log(f"Generating unconstrained direct templates for interval {interval_idx}")
         
         # Get the cost range for this interval
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        interval_start = intervals[interval_idx]
-        interval_end = intervals[interval_idx + 1]
+        interval_start, interval_end = self.interval_index.bounds(interval_idx)
         target_cost_range = (interval_start, interval_end)
         
         # Get the template generator
@@ -1082,19 +1308,11 @@ class SQLBarberRunner:
         # ------------------------------------------------------------------------
         # 1) Compute how many queries each cost-interval received in initial profiling
         # ------------------------------------------------------------------------
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        interval_coverage = [0] * self.num_intervals
+        intervals = self.interval_index.edges
 
         # Gather all costs from the entire initial profiling
-        for t_id, costs in profiling_result.items():
-            if costs is None:
-                continue
-            for cost in costs:
-                if cost is not None:
-                    for i in range(self.num_intervals):
-                        if intervals[i] <= cost < intervals[i + 1]:
-                            interval_coverage[i] += 1
-                            break
+        all_costs = [cost for costs in profiling_result.values() if costs is not None for cost in costs]
+        interval_coverage = [int(count) for count in self.interval_index.counts(all_costs)]
 
         self.log("===== Interval Coverage after Initial Profiling =====")
         for i in range(self.num_intervals):
@@ -1278,12 +1496,7 @@ class SQLBarberRunner:
             if costs is None:
                 return True
                 
-            coverage_counts = [0] * self.num_intervals
-            for c in costs:
-                if c is not None:
-                    for idx in range(self.num_intervals):
-                        if intervals[idx] <= c < intervals[idx + 1]:
-                            coverage_counts[idx] += 1
+            coverage_counts = self.interval_index.counts(costs)
 
             # Check missing intervals
             for mi_idx in get_missing_intervals():
@@ -1415,12 +1628,8 @@ class SQLBarberRunner:
                     local_distances.append(distance)
 
                     # Update coverage
-                    for c in costs:
-                        if c is not None:
-                            for idx in range(self.num_intervals):
-                                if intervals[idx] <= c < intervals[idx + 1]:
-                                    interval_coverage[idx] += 1
-                                    break
+                    for idx, count in enumerate(self.interval_index.counts(costs)):
+                        interval_coverage[idx] += int(count)
 
             # Write accepted templates to disk
             for idx, nt_id in enumerate(accepted_template_ids):
@@ -1543,79 +1752,107 @@ class SQLBarberRunner:
         self.log("Template refinement process is complete.")
         return profiling_result, min(distances) if distances else None
     
+    def save_checkpoint(self, phase, next_iteration, profiling_result, distances, timestamps, start_time):
+        """
+        Save everything generate_sql needs to continue after `phase` (and, while optimizing, before
+        iteration `next_iteration`). The file is replaced atomically, so an interrupted save keeps the previous checkpoint.
+        """
+        with self.state_lock:
+            checkpoint = {
+                'task_name': self.task_name,
+                'run_parameters': self.checkpoint_parameters(),
+                'phase': phase,
+                'next_iteration': next_iteration,
+                'saved_at': time.time(),
+                'start_time': start_time,
+                'distances': distances,
+                'timestamps': timestamps,
+                'profiling_result': profiling_result,
+                'target_distribution': self.target_distribution,
+                'current_distribution': self.current_distribution,
+                'template_ids': self.template_ids,
+                'templates': self.templates,
+                'missing_intervals': self.missing_intervals,
+                'bad_combinations': self.bad_combinations,
+                'template_remaining_spaces': self.template_remaining_spaces,
+                'selected_times_of_intervals': self.selected_times_of_intervals,
+                'results': self.results,
+                'exported_queries': self.exporter.num_queries,
+                'llm_usage': (self.gpt.total_prompt_tokens, self.gpt.total_completion_tokens, self.gpt.total_dollars)
+            }
+            tmp_file = f"{self.checkpoint_file}.tmp"
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(checkpoint, f)
+            os.replace(tmp_file, self.checkpoint_file)
+        self.log(f"Checkpoint saved after {phase}" + (f" (next iteration: {next_iteration + 1})" if phase == "iteration" else ""))
+
+    def checkpoint_parameters(self):
+        """ Parameters that must match for a checkpoint to be resumed """
+        return {
+            'total_sqls': self.total_sqls,
+            'min_cost': self.min_cost,
+            'max_cost': self.max_cost,
+            'num_intervals': self.num_intervals,
+            'target': self.target,
+            'cost_type': self.cost_type
+        }
+
+    def load_checkpoint(self):
+        """ The checkpoint of an earlier run with the same parameters, or None """
+        if not os.path.exists(self.checkpoint_file):
+            print(f"No checkpoint found at {self.checkpoint_file}, starting a new run.")
+            return None
+        try:
+            with open(self.checkpoint_file, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            print(f"Error loading checkpoint {self.checkpoint_file}: {e}, starting a new run.")
+            return None
+        if checkpoint['run_parameters'] != self.checkpoint_parameters():
+            print(f"Checkpoint {self.checkpoint_file} was saved with different parameters {checkpoint['run_parameters']}, starting a new run.")
+            return None
+        print(f"Resuming {checkpoint['task_name']} after {checkpoint['phase']}.")
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint):
+        """
+        Restore the runner state of a checkpoint. Returns (phase, next_iteration, profiling_result,
+        distances, timestamps, start_time), with times shifted so the interruption does not count as run time.
+        """
+        with self.state_lock:
+            for name in ['target_distribution', 'current_distribution', 'template_ids', 'templates', 'missing_intervals',
+                         'bad_combinations', 'template_remaining_spaces', 'selected_times_of_intervals', 'results']:
+                setattr(self, name, checkpoint[name])
+            # queries exported after the checkpoint are produced again by the resumed phase
+            self.exporter.truncate(checkpoint['exported_queries'])
+            self.gpt.total_prompt_tokens, self.gpt.total_completion_tokens, self.gpt.total_dollars = checkpoint['llm_usage']
+
+        pause = time.time() - checkpoint['saved_at']
+        timestamps = [timestamp + pause for timestamp in checkpoint['timestamps']]
+        self.log(f"Resumed from checkpoint after {checkpoint['phase']}, {len(self.results)} queries restored.")
+        return (checkpoint['phase'], checkpoint['next_iteration'], checkpoint['profiling_result'],
+                checkpoint['distances'], timestamps, checkpoint['start_time'] + pause)
+
     def save_workload_and_summary(self, distances, timestamps, start_time, end_time):
         """
         Save workload and summary information in JSON formats.
         """
         
-        # First, create the workload.json
-        workload_data = []
-        valid_query_count = 0
-        
-        for idx, (query, cost) in enumerate(zip(self.queries, self.costs)):
-            # Skip queries with None cost or outside the cost range
-            if cost is None or cost < self.min_cost or cost > self.max_cost:
-                continue
-            
-            valid_query_count += 1
-            
-            # Extract template ID from the query metadata
-            template_id_match = re.search(r'-- Template ID: (\d+)', query)
-            template_id = int(template_id_match.group(1)) if template_id_match else None
-            
-            # Extract just the SQL query (remove metadata comments)
-            query_lines = query.split('\n')
-            sql_start_idx = 0
-            for i, line in enumerate(query_lines):
-                if not line.strip().startswith('--') and line.strip():
-                    sql_start_idx = i
-                    break
-            
-            actual_query = '\n'.join(query_lines[sql_start_idx:]).strip()
-            
-            workload_data.append({
-                'query_id': valid_query_count,
-                'template_id': template_id,
-                'query': actual_query,
-                'cost_type': self.target,
-                'cost': cost
-            })
-        
-        # Sort by cost
-        workload_data.sort(key=lambda x: x['cost'])
-        
-        # Update query_ids after sorting
-        for idx, item in enumerate(workload_data):
-            item['query_id'] = idx + 1
-        
-        # Save workload.json
+        # The accepted queries were already streamed out, only the cost-sorted view is left to write
         workload_file = self.workload_file
-        with open(workload_file, 'w') as f:
-            json.dump(workload_data, f, indent=2)
+        workload_columns = self.exporter.finalize(workload_file)
         
         # Now create the summary.json
         
         # Calculate template statistics
         template_stats = defaultdict(int)
-        for item in workload_data:
-            if item['template_id'] is not None:
-                template_stats[item['template_id']] += 1
+        for template_id in workload_columns["template_id"]:
+            if template_id >= 0:
+                template_stats[int(template_id)] += 1
         
         # Calculate cost interval distribution
-        intervals = np.linspace(self.min_cost, self.max_cost, self.num_intervals + 1)
-        actual_distribution = [0] * self.num_intervals
-        
-        for item in workload_data:
-            cost = item['cost']
-            # Find which interval this cost belongs to
-            for i in range(self.num_intervals):
-                if intervals[i] <= cost < intervals[i + 1]:
-                    actual_distribution[i] += 1
-                    break
-                elif i == self.num_intervals - 1 and cost == intervals[i + 1]:
-                    # Handle edge case where cost equals max_cost
-                    actual_distribution[i] += 1
-                    break
+        intervals = self.interval_index.edges
+        actual_distribution = [int(count) for count in np.bincount(workload_columns["interval"], minlength=self.num_intervals)]
         
         # Create cost interval bounds for clarity
         interval_bounds = []
@@ -1632,7 +1869,7 @@ class SQLBarberRunner:
             'task_name': self.task_name,
             'generation_parameters': {
                 'total_sqls_requested': self.total_sqls,
-                'total_sqls_generated': len(workload_data),
+                'total_sqls_generated': len(workload_columns),
                 'min_cost': self.min_cost,
                 'max_cost': self.max_cost,
                 'num_intervals': self.num_intervals,
@@ -1679,43 +1916,61 @@ class SQLBarberRunner:
             num_iterations (int): Number of iterations to optimize the current distribution.
         """
 
-        timestamps = []
-        distances = []
-        distance = self.compare_and_plot_distributions("target_distribution")
-        distances.append(distance)
-        start_time = time.time()
-        timestamps.append(start_time)
+        if self.resume_checkpoint is not None:
+            phase, next_iteration, profiling_result, distances, timestamps, start_time = self.restore_checkpoint(self.resume_checkpoint)
+            self.resume_checkpoint = None
+        else:
+            phase, next_iteration = None, 0
+            timestamps = []
+            distances = []
+            distance = self.compare_and_plot_distributions("target_distribution")
+            distances.append(distance)
+            start_time = time.time()
+            timestamps.append(start_time)
         
-        # Step 1: Generate SQL templates
-        self.template_generation(prompt_template, semantic_requirements, generate_new_sql_tamplate)
+            # Step 1: Generate SQL templates
+            self.template_generation(prompt_template, semantic_requirements, generate_new_sql_tamplate)
         
-        # Step 2: Initial profiling of templates
-        profiling_result = self.initial_profiling(num_profiling)
-        self.update_distribution_profiling(profiling_result)
-        distance = self.compare_and_plot_distributions("initial_profiling")
-        distances.append(distance)
-        timestamps.append(time.time())
-
-        # Step 3: Refine templates
-        profiling_result, distance = self.template_refinement_parallel(profiling_result, num_profiling)
-        distances.append(distance)
-        timestamps.append(time.time())
-
-        # Step 4: Re-Initialize a list to track missing intervals
-        self.missing_intervals = []
+            # Step 2: Initial profiling of templates
+            profiling_result = self.initial_profiling(num_profiling)
+            self.update_distribution_profiling(profiling_result)
+            distance = self.compare_and_plot_distributions("initial_profiling")
+            distances.append(distance)
+            timestamps.append(time.time())
+            phase = "initial_profiling"
+            self.save_checkpoint(phase, next_iteration, profiling_result, distances, timestamps, start_time)
+
+        if phase == "initial_profiling":
+            # Step 3: Refine templates
+            profiling_result, distance = self.template_refinement_parallel(profiling_result, num_profiling)
+            distances.append(distance)
+            timestamps.append(time.time())
+
+            # Step 4: Re-Initialize a list to track missing intervals
+            self.missing_intervals = []
+            phase = "template_refinement"
+            self.save_checkpoint(phase, next_iteration, profiling_result, distances, timestamps, start_time)
+
         # Step 5: Iteratively optimize until the current distribution matches the target distribution
-        for iteration in range(num_iterations):
+        if phase == "optimization":
+            # the interrupted run had already finished optimizing
+            next_iteration = num_iterations
+        for iteration in range(next_iteration, num_iterations):
             self.log(f"Iteration {iteration + 1}/{num_iterations}")
 
             # Step 6: Optimize for the interval with the largest difference
             # num_difference = self.optimize_for_interval_naive(profiling_result, reuse_history=reuse_history)
-            num_difference = self.optimize_for_interval(profiling_result, reuse_history=reuse_history)
+            if self.optimization_workers > 1:
+                num_difference = self.optimize_for_intervals_parallel(profiling_result, reuse_history=reuse_history)
+            else:
+                num_difference = self.optimize_for_interval(profiling_result, reuse_history=reuse_history)
 
             # Step 7: Optionally, plot the current vs. target distribution for monitoring
             distance = self.compare_and_plot_distributions(f"iteration_{iteration + 1}")
             distances.append(distance)
             timestamps.append(time.time())
             self.log(f"The wasserstein_distance after iteration {iteration + 1} is {distance}")
+            self.save_checkpoint("iteration", iteration + 1, profiling_result, distances, timestamps, start_time)
 
             # no difference between current distribution and target distribution
             if num_difference <= 0:
@@ -1740,6 +1995,7 @@ class SQLBarberRunner:
                     self.log(f"Stopping optimization: distance has not changed for the last 3 iterations (distance={last_three[0]}).")
                     break
         end_time = time.time()
+        self.save_checkpoint("optimization", num_iterations, profiling_result, distances, timestamps, start_time)
 
         # Step 8: Log the missing intervals for which no templates were found
         if self.missing_intervals:
@@ -7,6 +7,7 @@ import math
 import re
 import concurrent.futures
 from pathlib import Path
+from .template_renderer import TemplateRenderer
 
 class NaiveSQLTemplateGenerator:
     def __init__(self, task_name, db_controller, llm, folder_path=f"{Path(__file__).resolve().parents[2]}/outputs/final/sql_template"):
@@ -816,18 +817,14 @@ Now let's think step by step and provide the SQL query template. Return the resu
         """ 
             Extract placeholders from the SQL template 
         """
-        placeholder_pattern = r"\{\{(\w+\.\w+)\}\}"
-        placeholders = re.findall(placeholder_pattern, sql_template)
-
-        return placeholders
+        return list(TemplateRenderer.compile(sql_template).slot_names)
 
     def replace_placeholders(self, sql_template, sample_values):
         # Replace placeholders with actual values
-        sql = sql_template
-
-        placeholders = self.identify_placeholders(sql)
+        renderer = TemplateRenderer.compile(sql_template)
 
-        for placeholder in placeholders:
+        values = {}
+        for placeholder in renderer.placeholders:
             sub_placeholder = re.sub(r'_(start|end)$', '', placeholder)
 
             value = sample_values.get(sub_placeholder, "'test'")
@@ -835,10 +832,10 @@ Now let's think step by step and provide the SQL query template. Return the resu
                 value = value.strip()
             else:
                 value = str(value)
+            values[placeholder] = value
 
-            sql = sql.replace(f"{{{{{placeholder}}}}}", value)
-
-        return sql
+        # sample values may carry their own quotes (e.g. the 'test' default), so they are inserted unchanged
+        return renderer.render(values, escape_literals=False)
 
     def check_and_rewrite_templates_parallel(self):
         """
@@ -0,0 +1,59 @@
+"""
+Per-column value domains of the predicate search space, built once per column and shared by
+every PredicateEnumerator (and every template) of a process
+"""
+
+import threading
+import numpy as np
+from .column_metadata import ColumnMetadata
+
+NUMERIC_TYPES = ['integer', 'bigint', 'smallint', 'float', 'double precision', 'numeric', 'real']
+NON_NUMERIC_TYPES = ['text', 'varchar', 'boolean', 'character', 'character varying', 'date']
+
+
+class ValueDomain:
+    """
+    The sampled distinct values of one column in search order: sorted by value for numeric columns,
+    in column_info.json order otherwise.
+        labels  tuple of the string forms of the values, the ordinal sequence seen by the optimizers
+    A config value (a label) maps back to its original value by index, without a per-enumerator
+    {str -> value} dict.
+    """
+
+    _domains = {}
+    _domains_lock = threading.Lock()
+
+    def __init__(self, distinct_values, numeric):
+        self.numeric = numeric
+        if numeric:
+            order = np.argsort(np.array(distinct_values, dtype=np.float64), kind="stable")
+            self._originals = [distinct_values[idx] for idx in order]
+        else:
+            self._originals = list(distinct_values)
+        self.labels = tuple(str(value) for value in self._originals)
+        self.label_index = {label: idx for idx, label in enumerate(self.labels)}
+
+    @classmethod
+    def shared(cls, file_path, table_name, column_name, column_meta):
+        """
+        The domain of a column of the column_info.json at file_path, None if the column type is not
+        searched or it has no sampled values. Rebuilt only when the file changes.
+        """
+        column_type = column_meta.get('type')
+        if column_type not in NUMERIC_TYPES and column_type not in NON_NUMERIC_TYPES:
+            return None
+        domain_key = (ColumnMetadata.version(file_path), table_name, column_name)
+        with cls._domains_lock:
+            if domain_key not in cls._domains:
+                distinct_values = column_meta.get('sampled_distinct_values', [])
+                cls._domains[domain_key] = cls(distinct_values, column_type in NUMERIC_TYPES) if distinct_values else None
+            return cls._domains[domain_key]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def decode(self, label):
+        """ The original value of a label; labels outside the domain are returned unchanged """
+        idx = self.label_index.get(label)
+        return label if idx is None else self._originals[idx]
+
@@ -0,0 +1,143 @@
+"""
+Streaming export of the accepted queries of a SQLBarber run, written while the run is in progress
+"""
+
+import os
+import json
+import threading
+import numpy as np
+
+
+class WorkloadExporter:
+    """
+    Appends every accepted query to two files next to workload.json:
+        workload.jsonl      one JSON object per query, in production order
+        workload_columns.bin fixed-width records (COLUMN_DTYPE) with the byte offset of the query's
+                            JSONL line, its template id, cost and interval index
+    A record is only written after its JSONL line is flushed, so after a crash every record
+    points at a complete line; torn tails are cut off when the files are reopened.
+    finalize() produces the cost-sorted workload.json from the columns, reading the JSONL lines
+    one at a time instead of loading the whole workload.
+    """
+
+    COLUMN_DTYPE = np.dtype([("offset", "<i8"), ("template_id", "<i4"), ("cost", "<f8"), ("interval", "<i4")])
+
+    def __init__(self, folder_path, cost_type):
+        self.folder_path = folder_path
+        self.cost_type = cost_type
+        self.jsonl_file = os.path.join(folder_path, "workload.jsonl")
+        self.columns_file = os.path.join(folder_path, "workload_columns.bin")
+        os.makedirs(folder_path, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._open()
+
+    def _open(self, num_queries=None):
+        self._truncate_files(num_queries)
+        self._jsonl = open(self.jsonl_file, "ab")
+        self._columns = open(self.columns_file, "ab")
+        self.num_queries = os.path.getsize(self.columns_file) // self.COLUMN_DTYPE.itemsize
+
+    def _truncate_files(self, num_queries=None):
+        """
+        Keep the first num_queries records (all complete ones if None), dropping a partial column
+        record and any JSONL bytes that no kept record refers to
+        """
+        if not os.path.exists(self.columns_file) or not os.path.exists(self.jsonl_file):
+            open(self.jsonl_file, "wb").close()
+            open(self.columns_file, "wb").close()
+            return
+
+        num_records = os.path.getsize(self.columns_file) // self.COLUMN_DTYPE.itemsize
+        if num_queries is not None:
+            num_records = min(num_records, num_queries)
+        with open(self.columns_file, "r+b") as columns:
+            columns.truncate(num_records * self.COLUMN_DTYPE.itemsize)
+
+        jsonl_end = 0
+        if num_records > 0:
+            last_record = np.fromfile(self.columns_file, dtype=self.COLUMN_DTYPE, count=1, offset=(num_records - 1) * self.COLUMN_DTYPE.itemsize)[0]
+            with open(self.jsonl_file, "rb") as jsonl:
+                jsonl.seek(int(last_record["offset"]))
+                jsonl.readline()
+                jsonl_end = jsonl.tell()
+        with open(self.jsonl_file, "r+b") as jsonl:
+            jsonl.truncate(jsonl_end)
+
+    @staticmethod
+    def strip_metadata(query):
+        """ The SQL of a generated query without its leading metadata comments """
+        query_lines = query.split('\n')
+        sql_start_idx = 0
+        for i, line in enumerate(query_lines):
+            if not line.strip().startswith('--') and line.strip():
+                sql_start_idx = i
+                break
+        return '\n'.join(query_lines[sql_start_idx:]).strip()
+
+    def append(self, queries, costs, template_ids, intervals):
+        """ Append accepted queries; entries with interval -1 (cost outside the range) are skipped """
+        with self._lock:
+            records = []
+            for query, cost, template_id, interval in zip(queries, costs, template_ids, intervals):
+                if interval < 0:
+                    continue
+                self.num_queries += 1
+                item = {
+                    'query_id': self.num_queries,
+                    'template_id': None if template_id < 0 else int(template_id),
+                    'query': self.strip_metadata(query),
+                    'cost_type': self.cost_type,
+                    'cost': float(cost)
+                }
+                offset = self._jsonl.tell()
+                self._jsonl.write((json.dumps(item) + "\n").encode("utf-8"))
+                records.append((offset, template_id, cost, interval))
+            if not records:
+                return
+
+            self._jsonl.flush()
+            self._columns.write(np.array(records, dtype=self.COLUMN_DTYPE).tobytes())
+            self._columns.flush()
+
+    def truncate(self, num_queries):
+        """ Forget every query exported after the first num_queries, e.g. when resuming from a checkpoint """
+        with self._lock:
+            self._jsonl.close()
+            self._columns.close()
+            self._open(num_queries)
+
+    def load_columns(self):
+        """ Template id, cost and interval columns of every exported query """
+        with self._lock:
+            self._columns.flush()
+            return np.fromfile(self.columns_file, dtype=self.COLUMN_DTYPE)
+
+    def finalize(self, workload_file):
+        """
+        Write the exported queries sorted by cost (query ids renumbered in that order) to
+        workload_file, in the same indented JSON layout as before. Returns the sorted columns.
+        """
+        columns = self.load_columns()
+        columns = columns[np.argsort(columns["cost"], kind="stable")]
+
+        tmp_file = f"{workload_file}.tmp"
+        with open(self.jsonl_file, "rb") as jsonl, open(tmp_file, "w") as f:
+            if len(columns) == 0:
+                f.write("[]")
+            else:
+                f.write("[\n")
+                for idx, offset in enumerate(columns["offset"]):
+                    jsonl.seek(int(offset))
+                    item = json.loads(jsonl.readline())
+                    item['query_id'] = idx + 1
+                    item_text = json.dumps(item, indent=2).replace("\n", "\n  ")
+                    f.write(f"  {item_text}" + (",\n" if idx + 1 < len(columns) else "\n"))
+                f.write("]")
+        os.replace(tmp_file, workload_file)
+        return columns
+
+    def close(self):
+        with self._lock:
+            self._jsonl.close()
+            self._columns.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the packages live in src/ and are imported as top-level packages, as run_sqlbarber.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,75 @@
+import json
+
+from db_controller.postgresql_controller import PostgreSQLController
+
+
+class FakeCursor:
+    def __init__(self, tables, signatures):
+        self.tables = tables
+        self.signatures = signatures
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if "information_schema.tables" in sql:
+            self.rows = [(table,) for table in self.tables]
+        else:
+            self.rows = list(self.signatures.items())
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self, tables, signatures):
+        self.tables = tables
+        self.signatures = signatures
+
+    def cursor(self):
+        return FakeCursor(self.tables, self.signatures)
+
+
+def make_controller(signatures, failing_tables):
+    # no server: only the attributes get_column_info uses on a single connection
+    controller = PostgreSQLController.__new__(PostgreSQLController)
+    controller.connection = FakeConnection(list(signatures), signatures)
+
+    def collect_table_info(connection, table_name, sampled, sample_rows, representative_values):
+        if table_name in failing_tables:
+            raise RuntimeError("connection reset")
+        return {"id": {"type": "integer", "collected_at": signatures[table_name]}}
+
+    controller._collect_table_info = collect_table_info
+    return controller
+
+
+def read_column_info(folder):
+    with open(folder / "column_info.json", encoding="utf-8") as json_file:
+        metadata = json.load(json_file)
+    with open(folder / "column_info_state.json", encoding="utf-8") as json_file:
+        state = json.load(json_file)
+    return metadata, state["tables"]
+
+
+def test_failed_refresh_keeps_previous_table_metadata(tmp_path):
+    make_controller({"a": "v1", "b": "v1"}, set()).get_column_info(str(tmp_path), workers=1)
+
+    make_controller({"a": "v2", "b": "v2"}, {"b"}).get_column_info(str(tmp_path), workers=1, refresh=True)
+    metadata, signatures = read_column_info(tmp_path)
+
+    assert metadata["a"]["id"]["collected_at"] == "v2"
+    assert metadata["b"]["id"]["collected_at"] == "v1"
+    # the failed table keeps its old signature and is retried by the next refresh
+    assert signatures == {"a": "v2", "b": "v1"}
+
+
+def test_failed_new_table_is_recorded_empty_without_signature(tmp_path):
+    make_controller({"a": "v1", "b": "v1"}, {"b"}).get_column_info(str(tmp_path), workers=1)
+    metadata, signatures = read_column_info(tmp_path)
+
+    assert metadata["b"] == {}
+    assert signatures == {"a": "v1"}
@@ -0,0 +1,103 @@
+import json
+import math
+import re
+
+import pytest
+
+from sqlbarber.predicate_enumerator import PredicateEnumerator
+
+
+class FakeDBController:
+    """ Records the EXPLAIN batches and answers with the value of the predicate as the row estimate """
+
+    def __init__(self):
+        self.explained = []
+
+    def explain_many(self, queries):
+        self.explained.append(list(queries))
+        return [{"Plan": {"Plan Rows": int(re.search(r"< (\d+)", query).group(1))}} for query in queries]
+
+
+class FakeCardEstimator:
+    """ log(1 + rows) of the single comparison, so the screen calibrates to an exact fit """
+
+    def log_rows(self, predicates):
+        return sum(math.log1p(float(value)) for _, _, _, value in predicates)
+
+
+@pytest.fixture
+def enumerator(tmp_path):
+    column_info = tmp_path / "column_info.json"
+    column_info.write_text(json.dumps({"t": {"x": {"type": "integer", "sampled_distinct_values": list(range(1, 101))}}}))
+    enumerator = PredicateEnumerator(
+        "unit_test", FakeDBController(), "t1", "SELECT COUNT(*) FROM t WHERE t.x < {{t.x}};", [10, 20],
+        str(column_info), target="card", card_estimator=FakeCardEstimator(), batch_size=8
+    )
+    enumerator.define_search_space()
+    enumerator.card_screen.explore_every = 1000
+    for value in range(1, 100, 12):
+        enumerator.card_screen.observe(math.log1p(value), value)
+    return enumerator
+
+
+def configs(*values):
+    return [{"t.x": str(value)} for value in values]
+
+
+def test_prefetch_plans_explains_only_promising_queries(enumerator):
+    enumerator.prefetch_plans(configs(2, 12, 15, 60, 95))
+
+    assert enumerator.db_controller.explained == [[
+        "SELECT COUNT(*) FROM t WHERE t.x < 12;",
+        "SELECT COUNT(*) FROM t WHERE t.x < 15;",
+    ]]
+
+
+def test_screened_configs_are_scored_without_explain(enumerator):
+    enumerator.prefetch_plans(configs(12, 60))
+    enumerator.set_and_replay(configs(12)[0])
+    enumerator.set_and_replay(configs(60)[0])
+
+    assert enumerator.db_controller.explained == [["SELECT COUNT(*) FROM t WHERE t.x < 12;"]]
+    assert enumerator.costs == [12]
+
+
+class FakeSMAC:
+    """ Ask/tell interface of the SMAC facade, proposing a fixed list of configs """
+
+    class Optimizer:
+        def __init__(self, remaining_trials):
+            self.remaining_trials = remaining_trials
+            self.saved = False
+
+        def save(self):
+            self.saved = True
+
+    class TrialInfo:
+        def __init__(self, config):
+            self.config = config
+            self.seed = 0
+
+    def __init__(self, proposals):
+        self.proposals = list(proposals)
+        self.optimizer = self.Optimizer(len(self.proposals))
+        self.told = []
+
+    def ask(self):
+        return self.TrialInfo(self.proposals.pop(0))
+
+    def tell(self, trial_info, trial_value, save=True):
+        self.told.append((trial_info.config, trial_value.cost))
+        self.optimizer.remaining_trials -= 1
+
+
+def test_smac_batches_explain_only_screened_in_trials(enumerator):
+    smac = FakeSMAC(configs(3, 11, 70, 18, 45, 90, 14, 99, 16, 2))
+    enumerator.run_smac_in_batches(smac)
+
+    assert enumerator.db_controller.explained == [
+        ["SELECT COUNT(*) FROM t WHERE t.x < 11;", "SELECT COUNT(*) FROM t WHERE t.x < 18;", "SELECT COUNT(*) FROM t WHERE t.x < 14;"],
+        ["SELECT COUNT(*) FROM t WHERE t.x < 16;"],
+    ]
+    assert len(smac.told) == 10
+    assert smac.optimizer.saved